@@ -1,21 +1,63 @@
 from tasks import static_analysis
+from celery.exceptions import TimeoutError
+from celery.result import ResultSet
 import argparse
-import time
+import configparser
 
 
-parser = argparse.ArgumentParser()
-parser.add_argument("filename", type=str, help="Enter FileName") 
-parser.add_argument("mac", type=str, help="Enter MAC Address")
-parser.add_argument("source_type", type=str, help="Enter Source Type")
-args = parser.parse_args()
+parser = configparser.ConfigParser()
+parser.read('config.cfg')
+result_timeout = parser.getint('celery', 'result_timeout', fallback=3600)
 
-res = static_analysis.delay(args.filename, args.mac, args.source_type)
+# verdict sent for a task that raised, its exception text is not a verdict
+FAILED = "error"
 
-final_result = res.result
 
-while not final_result:
-	final_result = res.result
+def submit(filename, mac="None", source_type="None"):
+	return static_analysis.delay(filename, mac, source_type)
 
-print final_result
 
+def wait_result(res, timeout=result_timeout):
+	# blocks on the result backend (redis pub/sub) instead of spinning
+	# on res.result
+	try:
+		final_result = res.get(timeout=timeout, propagate=False)
+	except TimeoutError:
+		return "timeout"
+	if res.failed():
+		print "task %s failed : %s" % (res.id, final_result)
+		return FAILED
+	return str(final_result)
 
+
+def wait_results(results, callback, timeout=result_timeout):
+	# callback(task_id, verdict) runs as each task finishes, not in
+	# submission order; whatever is left at the timeout reports "timeout"
+	done = set()
+	by_id = dict((res.id, res) for res in results)
+
+	def on_result(task_id, value):
+		done.add(task_id)
+		if by_id[task_id].failed():
+			print "task %s failed : %s" % (task_id, value)
+			callback(task_id, FAILED)
+		else:
+			callback(task_id, str(value))
+
+	try:
+		ResultSet(results).join_native(timeout=timeout, propagate=False, callback=on_result)
+	except TimeoutError:
+		for res in results:
+			if res.id not in done:
+				callback(res.id, "timeout")
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument("filename", type=str, help="Enter FileName") 
+	parser.add_argument("mac", type=str, help="Enter MAC Address")
+	parser.add_argument("source_type", type=str, help="Enter Source Type")
+	args = parser.parse_args()
+
+	res = submit(args.filename, args.mac, args.source_type)
+	print wait_result(res)
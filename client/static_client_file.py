@@ -1,45 +1,191 @@
+import os
+import sys
+import json
 import socket
-import time
+import hashlib
+import zipfile
 import argparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+import protocol
+
 
 parser = argparse.ArgumentParser()
 parser.add_argument("sip", type=str, help="Enter File IP Address")
 parser.add_argument("port", type=int, help="Enter Port Number")
-parser.add_argument("file_name", type=str, help="Enter File Name")
+parser.add_argument("file_name", type=str, nargs='+', help="Enter File Name or directory")
 parser.add_argument("source_type", type=str, help="Enter Source Type")
+parser.add_argument("-z", "--expand-zip", action="store_true", help="Submit the members of zip archives instead of the archives")
+parser.add_argument("-p", "--password", type=str, default="infected", help="Password of zip archives")
+parser.add_argument("-r", "--reports", type=str, help="Directory for json reports, named by md5")
+parser.add_argument("-m", "--manifest", type=str, help="Write name;md5;sha256;verdict;source lines here")
 args = parser.parse_args()
 
+QUERY_BATCH = 1000
+
+
+def plain_file(path):
+	return lambda: open(path, 'rb')
+
+
+def zip_member(zf, info):
+	return lambda: zf.open(info, pwd=args.password)
+
+
+def list_samples(names):
+	# (name, upload name, opener, report path) for every sample behind
+	# the arguments, directories are walked and with --expand-zip zip
+	# archives are read in place. docx, jar and apk are zip files too, so
+	# without it every file is submitted as it is
+	for name in names:
+		if os.path.isdir(name):
+			for root, dirs, files in os.walk(name):
+				dirs.sort()
+				for f in sorted(files):
+					path = os.path.join(root, f)
+					yield path, f, plain_file(path), None
+		elif args.expand_zip and zipfile.is_zipfile(name):
+			zf = zipfile.ZipFile(name)
+			for info in zf.infolist():
+				if not info.filename.endswith('/'):
+					yield name + ":" + info.filename, os.path.basename(info.filename), zip_member(zf, info), None
+		else:
+			yield name, os.path.basename(name), plain_file(name), name + ".json"
+
+
+def hash_sample(opener):
+	m = hashlib.md5()
+	s256 = hashlib.sha256()
+	size = 0
+	f = opener()
+	try:
+		while True:
+			data = f.read(protocol.BUFSIZE)
+			if not data:
+				break
+			m.update(data)
+			s256.update(data)
+			size += len(data)
+	finally:
+		f.close()
+	return m.hexdigest(), s256.hexdigest(), size
+
+
+# every name a sha256 was given under, in argument order
+sample_names = {}
+unique = {}
+for name, base, opener, report in list_samples(args.file_name):
+	try:
+		md5, sha256, size = hash_sample(opener)
+	except (IOError, RuntimeError, zipfile.BadZipfile) as e:
+		print "%s : skipped (%s)" % (name, e)
+		continue
+	sample_names.setdefault(sha256, []).append(name)
+	if sha256 not in unique:
+		unique[sha256] = (name, base, opener, size, report)
+
+if args.reports and not os.path.isdir(args.reports):
+	os.makedirs(args.reports)
+
+manifest = None
+if args.manifest:
+	manifest = open(args.manifest, 'w')
+	manifest.write("name;md5;sha256;verdict;source\n")
+
+
+def record(sha256, md5, verdict, source):
+	for name in sample_names.get(sha256, []):
+		print "%s : %s" % (name, verdict)
+		if manifest:
+			manifest.write("%s;%s;%s;%s;%s\n" % (name, md5, sha256, verdict, source))
+	if manifest:
+		manifest.flush()
+
+
+def write_report(s, report, header, size):
+	# the stored json report, or the verdict alone when the server has none
+	with open(report, 'wb') as f:
+		if not size:
+			json.dump({"md5": header['md5'], "verdict": header['verdict']}, f)
+		for data in protocol.recv_body(s, size):
+			f.write(data)
+
+
 s = socket.socket()
 host = args.sip
 port = args.port
 s.connect((host, port))
+protocol.tune_socket(s)
 
-s.send("rece")
-s.send(args.source_type)
-s.recv(4)
-s.send(str(len(args.file_name)))
-s.send(args.file_name)
-
-f = open(args.file_name,'rb')
-l = f.read(1024)
-while (l):
-   s.send(l)
-   l = f.read(1024)
-f.close()
-s.close()
+protocol.send_hello(s)
+protocol.recv_hello(s)
+
+# ask for known verdicts first, duplicates and samples scanned before
+# never leave this machine
+hashes = unique.keys()
+known = []
+for i in xrange(0, len(hashes), QUERY_BATCH):
+	protocol.send_frame(s, protocol.QUERY, {"sha256": hashes[i:i+QUERY_BATCH]})
+	ftype, header, size = protocol.recv_frame(s)
+	protocol.skip_body(s, size)
+	for sha256, result in header.get('results', {}).items():
+		record(sha256, result['md5'], result['verdict'], "cache")
+		report = unique.pop(sha256)[4]
+		if args.reports:
+			report = os.path.join(args.reports, result['md5'] + ".json")
+		if report:
+			known.append((sha256, report))
 
-s1 = socket.socket()
-s1.connect((host, port))
-s1.send("send")
-with open(args.file_name+".json", 'wb') as f:
-    result = s1.recv(1)
-    print result
-    while True:
-        data = s1.recv(1024)
-        if not data:
-            break
-        f.write(data)
-
-f.close()
-s1.close()
+# known samples still get their report
+for sha256, report in known:
+	protocol.send_frame(s, protocol.FETCH, {"sha256": sha256})
+	ftype, header, size = protocol.recv_frame(s)
+	if ftype != protocol.RESULT:
+		protocol.skip_body(s, size)
+		print "%s : %s" % (report, header.get('error'))
+		continue
+	write_report(s, report, header, size)
+
+# upload everything first, the workers start scanning while the next
+# sample is still on the wire
+jobs = {}
+for sha256, (name, base, opener, size, report) in unique.items():
+	protocol.send_frame(s, protocol.SUBMIT, {"name": base,
+		"source_type": args.source_type, "sha256": sha256}, body_size=size)
+	f = opener()
+	try:
+		protocol.send_file(s, f, size)
+	finally:
+		f.close()
+
+	ftype, header, body = protocol.recv_frame(s)
+	protocol.skip_body(s, body)
+	if ftype != protocol.JOB:
+		print "%s : %s" % (name, header.get('error'))
+		continue
+	jobs[header['job']] = (sha256, header['md5'], report)
+
+reports = bool(args.reports) or any(report for sha256, md5, report in jobs.values())
+protocol.send_frame(s, protocol.WAIT_ALL, {"jobs": jobs.keys(), "reports": reports})
+while True:
+	ftype, header, size = protocol.recv_frame(s)
+	if ftype == protocol.DONE:
+		break
+	if ftype != protocol.RESULT:
+		protocol.skip_body(s, size)
+		print "error : %s" % header.get('error')
+		continue
+
+	sha256, md5, report = jobs[header['job']]
+	if args.reports:
+		report = os.path.join(args.reports, md5 + ".json")
+	if report:
+		write_report(s, report, header, size)
+	else:
+		protocol.skip_body(s, size)
+	record(sha256, md5, header['verdict'], "scan")
+
+protocol.send_frame(s, protocol.BYE, {})
+s.close()
+if manifest:
+	manifest.close()
@@ -0,0 +1,127 @@
+import os
+import mmap
+import time
+import uuid
+import hashlib
+import threading
+from urlparse import urlparse
+from bloom import bloom_Filter, build_bloom
+from hash_store import digest_Index, HEADER
+
+# IOC lists (ips, urls, emails) are matched as whole entries. Next to
+# each list we keep a bloom filter (<list>.bloom) and a sorted index of
+# the md5 of every entry (<list>.keys.idx); a key has to pass the filter
+# before the index is searched. Both are rebuilt when the list changes.
+MAGIC = "MWAKEYS1"
+CHECK_INTERVAL = 60
+
+
+def list_keys(path):
+	with open(path, 'rb') as f:
+		for line in f:
+			line = line.strip()
+			if not line or line.startswith('#'):
+				continue
+			yield line
+			# url entries also block their host, the scanners look up
+			# both the full url and the domain
+			if line.startswith(('http://', 'https://')):
+				netloc = urlparse(line).netloc
+				if netloc:
+					yield netloc
+
+
+def key_digest(key):
+	return hashlib.md5(key).digest()
+
+
+class block_List():
+	def __init__(self, path):
+		self.path = path
+		self.lock = threading.Lock()
+		self.bloom = None
+		self.index = None
+		self.data = None
+		self.checked = 0
+		self.stamp = None
+		self.load()
+
+	def list_stamp(self):
+		try:
+			st = os.stat(self.path)
+		except OSError:
+			return None
+		return st.st_size, st.st_mtime
+
+	def close(self):
+		if self.bloom is not None:
+			self.bloom.close()
+		if self.data is not None:
+			self.data.close()
+		self.bloom = None
+		self.index = None
+		self.data = None
+
+	def load(self):
+		self.close()
+		self.stamp = self.list_stamp()
+		self.checked = time.time()
+		if self.stamp is None:
+			return
+
+		try:
+			if os.path.getmtime(self.path + ".keys.idx") < self.stamp[1]:
+				return self.rebuild()
+			self.bloom = bloom_Filter(self.path + ".bloom")
+			with open(self.path + ".keys.idx", 'rb') as f:
+				magic, size, count = HEADER.unpack(f.read(HEADER.size))
+				self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		except (IOError, OSError, ValueError):
+			return self.rebuild()
+
+		self.index = digest_Index(self.data, 16, count)
+		if magic != MAGIC or size != self.stamp[0]:
+			return self.rebuild()
+
+	def rebuild(self):
+		self.close()
+		digests = set(key_digest(key) for key in list_keys(self.path))
+		size = self.list_stamp()[0]
+
+		# bloom first, a crash before the index is replaced leaves a
+		# filter with extra keys rather than one missing some
+		build_bloom(self.path + ".bloom", digests, len(digests))
+
+		tmp_path = "%s.keys.idx.%s" % (self.path, uuid.uuid4().hex)
+		with open(tmp_path, 'wb') as f:
+			f.write(HEADER.pack(MAGIC, size, len(digests)))
+			f.write(''.join(sorted(digests)))
+		os.rename(tmp_path, self.path + ".keys.idx")
+
+		self.load()
+
+	def contains(self, key):
+		digest = key_digest(key.strip())
+		with self.lock:
+			if time.time() - self.checked > CHECK_INTERVAL:
+				self.checked = time.time()
+				if self.list_stamp() != self.stamp:
+					self.load()
+
+			if self.bloom is None or digest not in self.bloom:
+				return False
+			return digest in self.index
+
+
+lists = {}
+lists_lock = threading.Lock()
+
+def get_blocklist(path):
+	with lists_lock:
+		if path not in lists:
+			lists[path] = block_List(path)
+		return lists[path]
+
+
+if __name__ == "__main__":
+	print get_blocklist("data/ipblock.list").contains('127.0.0.1')
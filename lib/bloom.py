@@ -0,0 +1,60 @@
+import os
+import math
+import mmap
+import uuid
+import struct
+import hashlib
+
+# MAGIC | bit count | hash count | bit array
+MAGIC = "MWABLOM1"
+HEADER = struct.Struct("!8sQQ")
+HASHES = struct.Struct("<QQ")
+FP_RATE = 0.001
+
+
+def positions(key, bits, k):
+	# double hashing over one md5, k probes for the price of one digest
+	h1, h2 = HASHES.unpack(hashlib.md5(key).digest())
+	h2 |= 1
+	for i in xrange(k):
+		yield (h1 + i * h2) % bits
+
+
+class bloom_Filter():
+	def __init__(self, path):
+		self.path = path
+		with open(path, 'rb') as f:
+			magic, self.bits, self.k = HEADER.unpack(f.read(HEADER.size))
+			if magic != MAGIC:
+				raise ValueError("%s is not a bloom filter" % path)
+			self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+	def __contains__(self, key):
+		data = self.data
+		for pos in positions(key, self.bits, self.k):
+			if not ord(data[HEADER.size + (pos >> 3)]) & (1 << (pos & 7)):
+				return False
+		return True
+
+	def close(self):
+		self.data.close()
+
+
+def build_bloom(path, keys, count, fp_rate=FP_RATE):
+	# count only sizes the filter, more keys than that raise the false
+	# positive rate but never cause a miss
+	count = max(count, 1)
+	bits = int(math.ceil(-count * math.log(fp_rate) / (math.log(2) ** 2)))
+	bits = max(64, (bits + 7) & ~7)
+	k = max(1, int(round(float(bits) / count * math.log(2))))
+
+	table = bytearray(bits >> 3)
+	for key in keys:
+		for pos in positions(key, bits, k):
+			table[pos >> 3] |= 1 << (pos & 7)
+
+	tmp_path = "%s.%s" % (path, uuid.uuid4().hex)
+	with open(tmp_path, 'wb') as f:
+		f.write(HEADER.pack(MAGIC, bits, k))
+		f.write(table)
+	os.rename(tmp_path, path)
@@ -0,0 +1,184 @@
+import os
+import re
+import mmap
+import uuid
+import struct
+import bisect
+import binascii
+import threading
+from bloom import bloom_Filter, build_bloom
+
+# The text list stays the source of truth and is append only. Next to it
+# we keep one sorted binary index per hash type:
+#
+#   MAGIC | list size covered | record count | sorted raw digests
+#
+# and a bloom filter over all of them (<list>.bloom) so the common miss
+# never touches the index. Lines appended after the index was built are
+# read into a small set on the next lookup, the index is rebuilt once
+# that set grows too large or when the list shrinks.
+MAGIC = "MWAHASH1"
+HEADER = struct.Struct("!8sQQ")
+HASH_TYPES = {32: "md5", 40: "sha1", 64: "sha256"}
+REBUILD_TAIL = 50000
+
+hex_hash = re.compile(r'\b([0-9a-fA-F]{64}|[0-9a-fA-F]{40}|[0-9a-fA-F]{32})\b')
+
+
+def parse_hashes(text):
+	for match in hex_hash.finditer(text):
+		yield binascii.unhexlify(match.group(1).lower())
+
+
+class digest_Index(object):
+	# sequence view over the mmapped records, lets bisect search it
+	# without copying anything
+	def __init__(self, data, width, count):
+		self.data = data
+		self.width = width
+		self.count = count
+
+	def __len__(self):
+		return self.count
+
+	def __getitem__(self, i):
+		offset = HEADER.size + i * self.width
+		return self.data[offset:offset + self.width]
+
+	def __contains__(self, digest):
+		i = bisect.bisect_left(self, digest)
+		return i < self.count and self[i] == digest
+
+
+class hash_Store():
+	def __init__(self, path):
+		self.path = path
+		self.lock = threading.Lock()
+		self.indexes = {}
+		self.maps = []
+		self.bloom = None
+		self.tail = set()
+		self.seen = 0
+		self.load()
+
+	def index_path(self, width):
+		return "%s.%s.idx" % (self.path, HASH_TYPES[width * 2])
+
+	def close(self):
+		for m in self.maps:
+			m.close()
+		self.maps = []
+		self.indexes = {}
+		if self.bloom is not None:
+			self.bloom.close()
+			self.bloom = None
+
+	def load(self):
+		self.close()
+		try:
+			self.bloom = bloom_Filter(self.path + ".bloom")
+		except (IOError, ValueError):
+			return self.rebuild()
+
+		covered = None
+		for width in (16, 20, 32):
+			try:
+				f = open(self.index_path(width), 'rb')
+			except IOError:
+				return self.rebuild()
+			with f:
+				magic, size, count = HEADER.unpack(f.read(HEADER.size))
+				if magic != MAGIC or (covered is not None and size != covered):
+					return self.rebuild()
+				covered = size
+				data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			self.maps.append(data)
+			self.indexes[width] = digest_Index(data, width, count)
+
+		self.tail = set()
+		self.seen = covered
+		self.refresh()
+
+	def rebuild(self):
+		self.close()
+		digests = {16: set(), 20: set(), 32: set()}
+		size = 0
+		if os.path.isfile(self.path):
+			with open(self.path, 'rb') as f:
+				text = f.read()
+			# a half written last line is left for the next refresh
+			size = text.rfind("\n") + 1
+			for digest in parse_hashes(text[:size]):
+				digests[len(digest)].add(digest)
+
+		# bloom first, a crash before the indexes are replaced leaves a
+		# filter with extra keys rather than one missing some
+		count = sum(len(values) for values in digests.values())
+		build_bloom(self.path + ".bloom", (d for values in digests.values() for d in values), count)
+
+		for width, values in digests.items():
+			tmp_path = "%s.%s" % (self.index_path(width), uuid.uuid4().hex)
+			with open(tmp_path, 'wb') as f:
+				f.write(HEADER.pack(MAGIC, size, len(values)))
+				f.write(''.join(sorted(values)))
+			os.rename(tmp_path, self.index_path(width))
+
+		self.load()
+
+	def refresh(self):
+		# pick up lines appended since the index (or the last refresh)
+		try:
+			size = os.path.getsize(self.path)
+		except OSError:
+			size = 0
+
+		if size < self.seen:
+			return self.rebuild()
+		if size == self.seen:
+			return
+
+		with open(self.path, 'rb') as f:
+			f.seek(self.seen)
+			text = f.read(size - self.seen)
+		end = text.rfind("\n") + 1
+		self.tail.update(parse_hashes(text[:end]))
+		self.seen += end
+
+		if len(self.tail) > REBUILD_TAIL:
+			self.rebuild()
+
+	def contains(self, hexdigest):
+		try:
+			digest = binascii.unhexlify(hexdigest.strip().lower())
+		except (TypeError, binascii.Error):
+			return False
+
+		with self.lock:
+			self.refresh()
+			if digest in self.tail:
+				return True
+			if digest not in self.bloom:
+				return False
+			index = self.indexes.get(len(digest))
+			return index is not None and digest in index
+
+	def add(self, hexdigest):
+		with self.lock:
+			with open(self.path, 'ab') as f:
+				f.write(hexdigest.strip().lower() + "\n")
+			self.refresh()
+
+
+stores = {}
+stores_lock = threading.Lock()
+
+def get_store(path):
+	# loaded once per worker, the read only maps are safe to share after fork
+	with stores_lock:
+		if path not in stores:
+			stores[path] = hash_Store(path)
+		return stores[path]
+
+
+if __name__ == "__main__":
+	print get_store("data/unpaked_md5.list").contains('d41d8cd98f00b204e9800998ecf8427e')
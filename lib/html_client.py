@@ -8,22 +8,25 @@ import urllib2
 from BeautifulSoup import BeautifulSoup
 from bs4 import BeautifulSoup
 from js_client import js_Class
+from sample import Sample
 #import string; print(string.__file__)
 
 
 class html_Class():
 
-	def __init__(self, file_name, md5, url):
-		self.filename = file_name
+	def __init__(self, sample, url):
+		self.sample = sample
+		self.filename = sample.name
 		self.url = url
-		self.md5 = md5
-		self.filepath = "report/"+md5+"/"+file_name
-		self.reportpath = "report/"+md5+"/"+file_name + "_swf.report"
+		self.md5 = sample.md5
+		self.filepath = sample.filepath
+		self.reportpath = "report/"+sample.md5+"/"+sample.name + "_swf.report"
 
 	def html_Score(self):
 		self.html_scan()
-		js = js_Class(self.filename+".js", self.md5)
-                status = js.js_Score()
+		with Sample(self.filepath+".js") as script:
+			js = js_Class(script)
+                	status = js.js_Score()
 
 		return status
 
@@ -33,22 +36,19 @@ class html_Class():
 			soup = BeautifulSoup(page)
 			#script = soup.body.find('script')
 			html = re.findall(r'<script>(.*?)</script>', str(soup), re.DOTALL)
-			for i in html:
-				f = open(self.filepath+".js", 'w')
-				f.write(str(i))
-			f.close()
+			with open(self.filepath+".js", 'w') as f:
+				for i in html:
+					f.write(str(i) + "\n")
 
 		if self.url == None:
-			with open(self.filepath) as f:
-        			data = f.read().replace('\n', ' ')
-				soup = BeautifulSoup(data, 'html.parser')
-				html = re.findall(r'<script>(.*?)</script>', str(data), re.DOTALL)
+			data = self.sample.data[:].replace('\n', ' ')
+			soup = BeautifulSoup(data, 'html.parser')
+			html = re.findall(r'<script>(.*?)</script>', str(data), re.DOTALL)
+			with open(self.filepath+".js", 'w') as f:
 				for i in html:
-					f = open(self.filepath+".js", 'w')
-					f.write(str(i))
-				f.close()
+					f.write(str(i) + "\n")
 
 if __name__ == "__main__":
-	res = html_Class('index.html', '31c032f34f1c2561488e898c451e0666', "http://www.google.com")
+	res = html_Class(Sample('report/31c032f34f1c2561488e898c451e0666/index.html'), "http://www.google.com")
 	status = res.html_Score()
 	print status
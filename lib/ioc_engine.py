@@ -0,0 +1,147 @@
+import re
+import heapq
+import logging
+from registry import get_source, path_stamp
+
+logger = logging.getLogger('main')
+
+# pyahocorasick when installed, a find per literal otherwise
+try:
+	import ahocorasick
+except ImportError:
+	ahocorasick = None
+
+# python 2 re refuses patterns with more than 100 groups, regex
+# signatures are combined in batches that stay under it
+MAX_GROUPS = 90
+
+# the lists were matched line by line, ^ and $ still anchor at lines
+FLAGS = re.MULTILINE
+
+# backreferences, conditionals and inline flags would point at the
+# wrong group or change the other patterns once joined, such patterns
+# and those with named groups are compiled on their own
+STANDALONE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(|\(\?[iLmsux]+\)')
+
+
+class literal_Finder():
+	# str.find runs in C, a python loop over every byte of a large
+	# sample was slower than a find per literal. Overlapping hits are all
+	# reported, each literal is searched on its own
+	def __init__(self, literals):
+		self.literals = literals
+
+	def find(self, data, literal):
+		offset = data.find(literal)
+		while offset >= 0:
+			yield offset, literal
+			offset = data.find(literal, offset + 1)
+
+	def scan(self, data):
+		# in offset order, heapq.merge only reads ahead one hit per literal
+		return heapq.merge(*[self.find(data, literal) for literal in self.literals])
+
+
+class native_Automaton():
+	def __init__(self, literals):
+		self.automaton = ahocorasick.Automaton()
+		for literal in literals:
+			self.automaton.add_word(literal, literal)
+		self.automaton.make_automaton()
+
+	def scan(self, data):
+		if len(self.automaton) == 0:
+			return
+		for end, literal in self.automaton.iter(str(data)):
+			yield end - len(literal) + 1, literal
+
+
+class ioc_Engine():
+	def __init__(self, literals=(), regexes=()):
+		literals = sorted(set(literal for literal in literals if literal))
+		if not literals:
+			self.automaton = None
+		elif ahocorasick is not None:
+			self.automaton = native_Automaton(literals)
+		else:
+			self.automaton = literal_Finder(literals)
+		self.regexes = self.combine(regexes)
+
+	def combine(self, regexes):
+		# (combined pattern, [(pattern, compiled)]) batches, the combined
+		# pattern finds the hits and the single ones name them
+		batches = []
+		batch = []
+		groups = 0
+		for pattern in regexes:
+			try:
+				compiled = re.compile(pattern, FLAGS)
+			except re.error as e:
+				logger.error("bad ioc regex %r : %s" % (pattern, e))
+				continue
+			if compiled.groupindex or STANDALONE.search(pattern):
+				batches.append([(pattern, compiled)])
+				continue
+			if batch and groups + compiled.groups >= MAX_GROUPS:
+				batches.append(batch)
+				batch = []
+				groups = 0
+			batch.append((pattern, compiled))
+			groups += compiled.groups
+		if batch:
+			batches.append(batch)
+
+		combined = []
+		for batch in batches:
+			if len(batch) == 1:
+				combined.append((batch[0][1], batch))
+				continue
+			try:
+				combined.append((re.compile("|".join("(?:%s)" % pattern for pattern, compiled in batch), FLAGS), batch))
+			except (re.error, AssertionError, OverflowError) as e:
+				logger.error("ioc regex batch of %d does not compile, matched one by one : %s" % (len(batch), e))
+				combined.extend((compiled, [(pattern, compiled)]) for pattern, compiled in batch)
+		return combined
+
+	def scan(self, data):
+		# (offset, signature) for every literal and regex hit, each
+		# kind in one pass over the data
+		if self.automaton is not None:
+			for hit in self.automaton.scan(data):
+				yield hit
+
+		for combined, batch in self.regexes:
+			for match in combined.finditer(data):
+				for pattern, compiled in batch:
+					if compiled.match(data, match.start()):
+						yield match.start(), pattern
+						break
+
+	def search(self, data):
+		for hit in self.scan(data):
+			return hit
+		return None
+
+
+def load_signatures(path):
+	signatures = []
+	with open(path) as f:
+		for line in f.read().splitlines():
+			if line.strip() and not line.startswith('#'):
+				signatures.append(line.strip())
+	return signatures
+
+
+def get_engine(literal_path=None, regex_path=None):
+	# built once per worker and list version, see registry
+	def build():
+		literals = load_signatures(literal_path) if path_stamp(literal_path) else []
+		regexes = load_signatures(regex_path) if path_stamp(regex_path) else []
+		return ioc_Engine(literals, regexes)
+
+	return get_source(("ioc", literal_path, regex_path), [literal_path, regex_path], build)
+
+
+if __name__ == "__main__":
+	engine = ioc_Engine(["he", "she", "his", "hers"], [r"\d{3}-\d{4}"])
+	print list(engine.scan("ushers call 555-1234"))
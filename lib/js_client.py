@@ -5,21 +5,21 @@ import json
 import re
 import spidermonkey
 import enchant
+from sample import Sample
+from ioc_engine import get_engine
 
 class js_Class():
 
-	def __init__(self, file_name, md5):
-		self.filename = file_name
-		self.md5 = md5
+	def __init__(self, sample):
+		self.filename = sample.name
+		self.md5 = sample.md5
 		self.fun = ['String', 'eval']
 		self.rt = spidermonkey.Runtime()
 		self.cx = self.rt.new_context()
 
-		with open("report/"+self.md5+"/"+self.filename) as file1:
-			self.data1 = file1.readlines()
+		self.data1 = sample.data[:].splitlines(True)
 
-		with open('data/string_sig/malware_js') as malware:
-			self.mal=malware.read().splitlines()
+		self.mal = get_engine(regex_path='data/string_sig/malware_js')
 
 	def find_between(self, s, first, last ):
     		try:
@@ -50,11 +50,10 @@ class js_Class():
 					output1 = self.cx.execute(f)
 					dfg = re.search(r'('+fun1+'.*\()', data)
 					if dfg:
-						for mal in self.mal:
-							f_dict = re.search(r'('+mal+')', output1)
-							if f_dict:
-								self.score = 3
-								#return self.score
+						f_dict = self.mal.search(output1)
+						if f_dict:
+							self.score = 3
+							#return self.score
 
 				#f1 = re.search(r'('+ fun1  +'.*\(.*[a-zA-Z0-9]\);)', data)
 				f3 = re.findall(r'('+ fun1  +'.*\(.*[a-zA-Z0-9]\);)', data)
@@ -81,7 +80,7 @@ class js_Class():
 		return self.score
 
 if __name__ == "__main__":
-	res = js_Class('index.html.js', '31c032f34f1c2561488e898c451e0666')
+	res = js_Class(Sample('report/31c032f34f1c2561488e898c451e0666/index.html.js'))
 	status = res.js_Score()		
 	print status
 
@@ -4,17 +4,39 @@ import sys
 import re
 import logfile
 import logging
+from hachoir_core.stream import FileInputStream
+from sample import Sample
+from registry import get_source, read_lines
+from hachoir_parser import guessParser
+from hachoir_metadata import extractMetadata
 
 logger = logging.getLogger('Meta-Data')
 
 class meta_Scan():
-	def __init__(self, filepath, md5):
-		self.filepath = filepath
-		self.md5 = str(md5)
+	def __init__(self, sample, inprocess=True):
+		self.sample = sample
+		self.filepath = sample.filepath
+		self.md5 = str(sample.md5)
+		self.inprocess = inprocess
 		self.status = 1 
 
+	def get_metadata(self):
+		# the parser only pulls the header pages it needs from the file
+		parser = guessParser(FileInputStream(unicode(self.filepath), real_filename=self.filepath))
+		if not parser:
+			return []
+		metadata = extractMetadata(parser)
+		if not metadata:
+			return []
+		return metadata.exportPlaintext()
+
 	def get_details(self):
-		os.system("hachoir-metadata "+ self.filepath + " > report/"+self.md5+"/meta.info")
+		if self.inprocess:
+			with open("report/"+self.md5+"/meta.info", 'w') as f:
+				for line in self.get_metadata():
+					f.write(line.encode('utf-8') + "\n")
+		else:
+			os.system("hachoir-metadata "+ self.filepath + " > report/"+self.md5+"/meta.info")
 
 	def gen_array(self):
 		self.get_details()
@@ -32,18 +54,17 @@ class meta_Scan():
 						return self.status
 
 				if self.status == 1:
-					with open('data/meta_string') as data1:
-						rs1 = data1.readlines()
-						for r1 in rs1:
-							match = re.search(r'('+r+')', r1)
-							if match:
-								self.status = 3
-						logger.info("Get File status based on meta string status : %s" % self.status)
-						return self.status
+					rs1 = get_source('meta_string', ['data/meta_string'], lambda: read_lines('data/meta_string'))
+					for r1 in rs1:
+						match = re.search(r'('+r+')', r1)
+						if match:
+							self.status = 3
+					logger.info("Get File status based on meta string status : %s" % self.status)
+					return self.status
 			
 
 if __name__ == "__main__":
-	res = meta_Scan('/home/versa/xsl1', 'acc9f0271432b4d14e0fe4913dc8e62e')
+	res = meta_Scan(Sample('/home/versa/xsl1'))
 #	match = re.search(r'(\d+-\d+-\d+)','Creation date: 2000-11-24 03:32:13')
 #	date =  match.group(1)
 	print res.gen_array() 
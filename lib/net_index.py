@@ -0,0 +1,241 @@
+import os
+import re
+import mmap
+import time
+import uuid
+import struct
+import socket
+import bisect
+import threading
+from urlparse import urlparse
+from hash_store import HEADER
+
+# IP lists hold addresses, CIDR blocks (1.2.3.0/24) and ranges
+# (1.2.3.4-1.2.3.9). They are merged into disjoint integer ranges and
+# kept sorted next to the list (<list>.ranges.idx) so every worker maps
+# the same pages:
+#
+#   MAGIC | list size covered | range count | (start, end) pairs
+MAGIC = "MWARANG1"
+RANGE = struct.Struct("!II")
+CHECK_INTERVAL = 60
+
+ip_entry = re.compile(r'^(\d{1,3}(?:\.\d{1,3}){3})(?:\s*(/)\s*(\d{1,2})|\s*(-)\s*(\d{1,3}(?:\.\d{1,3}){3}))?')
+domain_entry = re.compile(r'^\*?\.?([a-z0-9_-]+(?:\.[a-z0-9_-]+)+)\.?$')
+
+
+def ip_to_int(ip):
+	try:
+		return struct.unpack("!I", socket.inet_aton(ip))[0]
+	except (socket.error, struct.error):
+		return None
+
+
+def parse_ranges(path):
+	ranges = []
+	with open(path) as f:
+		for line in f:
+			match = ip_entry.match(line.strip())
+			if not match:
+				continue
+			start = ip_to_int(match.group(1))
+			if start is None:
+				continue
+			if match.group(2):
+				bits = min(int(match.group(3)), 32)
+				mask = (0xffffffff << (32 - bits)) & 0xffffffff
+				start &= mask
+				end = start | (~mask & 0xffffffff)
+			elif match.group(4):
+				end = ip_to_int(match.group(5))
+				if end is None or end < start:
+					continue
+			else:
+				end = start
+			ranges.append((start, end))
+
+	# merge overlapping and adjacent ranges, bisect needs them disjoint
+	merged = []
+	for start, end in sorted(ranges):
+		if merged and start <= merged[-1][1] + 1:
+			merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+		else:
+			merged.append((start, end))
+	return merged
+
+
+def list_stamp(path):
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	return st.st_size, st.st_mtime
+
+
+class range_Starts(object):
+	# sequence of range starts over the mapped pairs, for bisect
+	def __init__(self, data, count):
+		self.data = data
+		self.count = count
+
+	def __len__(self):
+		return self.count
+
+	def __getitem__(self, i):
+		return self.range(i)[0]
+
+	def range(self, i):
+		return RANGE.unpack_from(self.data, HEADER.size + i * RANGE.size)
+
+
+class ip_Index():
+	def __init__(self, path):
+		self.path = path
+		self.lock = threading.Lock()
+		self.data = None
+		self.starts = None
+		self.stamp = None
+		self.checked = 0
+		self.load()
+
+	def close(self):
+		if self.data is not None:
+			self.data.close()
+		self.data = None
+		self.starts = None
+
+	def load(self):
+		self.close()
+		self.stamp = list_stamp(self.path)
+		self.checked = time.time()
+		if self.stamp is None:
+			return
+
+		index = self.path + ".ranges.idx"
+		try:
+			if os.path.getmtime(index) < self.stamp[1]:
+				return self.rebuild()
+			with open(index, 'rb') as f:
+				magic, size, count = HEADER.unpack(f.read(HEADER.size))
+				self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		except (IOError, OSError, struct.error):
+			return self.rebuild()
+
+		self.starts = range_Starts(self.data, count)
+		if magic != MAGIC or size != self.stamp[0]:
+			return self.rebuild()
+
+	def rebuild(self):
+		self.close()
+		ranges = parse_ranges(self.path)
+		size = list_stamp(self.path)[0]
+
+		index = self.path + ".ranges.idx"
+		tmp_path = "%s.%s" % (index, uuid.uuid4().hex)
+		with open(tmp_path, 'wb') as f:
+			f.write(HEADER.pack(MAGIC, size, len(ranges)))
+			f.write(''.join(RANGE.pack(start, end) for start, end in ranges))
+		os.rename(tmp_path, index)
+
+		self.load()
+
+	def contains(self, ip):
+		value = ip_to_int(ip.strip())
+		if value is None:
+			return False
+
+		with self.lock:
+			if time.time() - self.checked > CHECK_INTERVAL:
+				self.checked = time.time()
+				if list_stamp(self.path) != self.stamp:
+					self.load()
+
+			if self.starts is None:
+				return False
+			i = bisect.bisect_right(self.starts, value) - 1
+			return i >= 0 and self.starts.range(i)[1] >= value
+
+
+def get_host(entry):
+	if entry.startswith(('http://', 'https://')):
+		return urlparse(entry).hostname
+	match = domain_entry.match(entry)
+	if match and ip_to_int(match.group(1)) is None:
+		return match.group(1)
+	return None
+
+
+class domain_Trie():
+	# reversed label trie, an entry blocks the domain and all of its
+	# subdomains; lookups walk at most one node per label
+	def __init__(self, path):
+		self.path = path
+		self.lock = threading.Lock()
+		self.stamp = None
+		self.checked = 0
+		self.load()
+
+	def load(self):
+		self.root = {}
+		self.stamp = list_stamp(self.path)
+		self.checked = time.time()
+		if self.stamp is None:
+			return
+
+		with open(self.path) as f:
+			for line in f:
+				host = get_host(line.strip().lower())
+				if host:
+					self.add(host)
+
+	def add(self, host):
+		node = self.root
+		for label in reversed(host.strip(".").split(".")):
+			if None in node:
+				return
+			node = node.setdefault(label, {})
+		node.clear()
+		node[None] = True
+
+	def contains(self, host):
+		if not host:
+			return False
+		host = host.lower().split(":")[0].strip(".")
+
+		with self.lock:
+			if time.time() - self.checked > CHECK_INTERVAL:
+				self.checked = time.time()
+				if list_stamp(self.path) != self.stamp:
+					self.load()
+
+			node = self.root
+			for label in reversed(host.split(".")):
+				node = node.get(label)
+				if node is None:
+					return False
+				if None in node:
+					return True
+			return False
+
+
+ip_indexes = {}
+domain_tries = {}
+indexes_lock = threading.Lock()
+
+def get_ip_index(path):
+	with indexes_lock:
+		if path not in ip_indexes:
+			ip_indexes[path] = ip_Index(path)
+		return ip_indexes[path]
+
+
+def get_domain_trie(path):
+	with indexes_lock:
+		if path not in domain_tries:
+			domain_tries[path] = domain_Trie(path)
+		return domain_tries[path]
+
+
+if __name__ == "__main__":
+	print get_ip_index("data/ipblock.list").contains("127.0.0.1")
+	print get_domain_trie("data/urlblock.list").contains("www.example.com")
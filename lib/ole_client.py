@@ -5,17 +5,18 @@ import json
 from startup_verify_mac import Startup_Scann
 from swf_client import swf_Class
 import re
-import hashlib
+from sample import Sample, get_md5
 
 class ole_Class():
 
-	def __init__(self, file_name, md5):
-		self.filename = file_name
-		self.filepath = "report/"+ md5 +"/"+ file_name
-		self.reportpath = "report/"+ md5 +"/"+ file_name +".report"
-		self.md5 = md5
+	def __init__(self, sample):
+		self.sample = sample
+		self.filename = sample.name
+		self.filepath = sample.filepath
+		self.reportpath = "report/"+ sample.md5 +"/"+ sample.name +".report"
+		self.md5 = sample.md5
 		self.ole_scan()
-		self.file_suffix = file_name.split('.')[0]
+		self.file_suffix = sample.name.split('.')[0]
 
 	def ole_Score(self):
 		self.res = int(subprocess.call(['grep', 'SUSPICIOUS', self.reportpath]))
@@ -35,7 +36,7 @@ class ole_Class():
                                 if s:
                                         docname = s.group(0)
                                         os.system("mv "+docname+" report/"+self.md5+"/")
-                                        md5_1 = hashlib.md5(open("report/"+self.md5+"/"+docname).read()).hexdigest()
+                                        md5_1 = get_md5("report/"+self.md5+"/"+docname)
                                         get_value = Startup_Scann(md5_1)
                                         status = get_value.find_mac()
                                         self.result = 2
@@ -56,13 +57,13 @@ class ole_Class():
 					self.result = 2
                         		data1 = match.group(0).split(' ')[4]
 					os.system("mv "+data1+ " report/"+self.md5+"/")
-					md5_1 = hashlib.md5(open("report/"+self.md5+"/"+data1).read()).hexdigest()
+					md5_1 = get_md5("report/"+self.md5+"/"+data1)
 					get_value = Startup_Scann(md5_1)
 	        			status = get_value.find_mac()
 					if status == 3:
 						self.result = 3 
 
-					swf = swf_Class(self.filename, self.md5)
+					swf = swf_Class(self.sample)
                         		status = swf.swf_Score()
 					if status == 3:
 						self.result = 3
@@ -87,6 +88,6 @@ class ole_Class():
 	
 
 if __name__ == "__main__":
-	rep = ole_Class('sample1.doc', '31c032f34f1c2561488e898c451e0666')
+	rep = ole_Class(Sample('report/31c032f34f1c2561488e898c451e0666/sample1.doc'))
 	report = rep.ole_Score()	
 	print report
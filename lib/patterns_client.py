@@ -4,52 +4,46 @@ import time
 import os
 import json
 import re
+from sample import Sample
+from blocklist import get_blocklist
+from net_index import get_ip_index, get_domain_trie
+from ioc_engine import get_engine
 
 class patterns_Class():
 
-	def __init__(self, file_name, md5):
-		self.filename = file_name
-		self.filepath = "report/"+ md5 +"/"+ file_name
-		self.reportpath = "report/"+ md5 +"/"+ file_name +"_pattern.report"
+	def __init__(self, sample):
+		self.filename = sample.name
+		self.filepath = sample.filepath
+		self.reportpath = "report/"+ sample.md5 +"/"+ sample.name +"_pattern.report"
 		self.pat_scan()
 		self.score = 1
 
                 with open(self.reportpath, 'r') as myfile:
                         self.data=myfile.read().replace('\n', '')
 
-		
-                with open('data/ipblock.list', 'r') as myfile:
-                        self.iplist=myfile.read().replace('\n', ' ')
-
-                with open('data/urlblock.list', 'r') as myfile:
-                        self.urllist=myfile.read().replace('\n', ' ')
 
-                with open('data/emailblock.list', 'r') as myfile:
-                        self.emaillist=myfile.read().replace('\n', ' ')
+		self.iplist = get_ip_index('data/ipblock.list')
+		self.urllist = get_blocklist('data/urlblock.list')
+		self.domainlist = get_domain_trie('data/urlblock.list')
+		self.emaillist = get_blocklist('data/emailblock.list')
 
-                with open('data/pattern.list') as myfile:
-                        self.patternlist=myfile.readlines()
+		self.patterns = get_engine(regex_path='data/pattern.list')
 
 	def check_pattern(self):
-                with open(self.reportpath) as rp:
-			lines = rp.readlines()
-			for line in lines:
-				for pat in self.patternlist:
-					pat_match = re.findall(r'('+pat+')', line)
-					if pat_match:
-						self.score = 3
-						return self.score
-
-					
+		# all patterns combined, one pass over the balbuzard report, ^ and $
+		# anchor at its lines as they did when it was read line by line
+		with open(self.reportpath) as rp:
+			if self.patterns.search(rp.read()):
+				self.score = 3
+
 		return self.score
 
 	def check_email(self):
 		
                 emails = re.findall(r'[\w\-][\w\-\.]+@[\w\-][\w\-\.]+[a-zA-Z]{1,4}', self.data)
 		
-		for email in emails:
-			email_search = re.search(r'('+ email +')', self.emaillist)
-			if email_search:
+		for email in set(emails):
+			if self.emaillist.contains(email):
 				self.score = 3
 
 		return self.score
@@ -64,12 +58,7 @@ class patterns_Class():
                         self.url_full = o.geturl()
                         self.domain = o.netloc
 
-			url_search = re.search(r'('+ self.url_full +')', self.urllist)
-			if url_search:
-				self.score = 3
-
-			domain_search = re.search(r'('+ self.domain +')', self.urllist)
-			if domain_search:
+			if self.urllist.contains(self.url_full) or self.domainlist.contains(o.hostname):
 				self.score = 3
 	
 		return self.score
@@ -77,9 +66,8 @@ class patterns_Class():
 
 	def check_ip(self):
 		ips = re.findall(r"\d{1,3}(?:\.\d{1,3}){3}", self.data)
-		for ip in ips:
-			ip_search = re.search(r'('+ ip +')', self.iplist)
-			if ip_search:
+		for ip in set(ips):
+			if self.iplist.contains(ip):
 				self.score = 3
 
 		return self.score
@@ -117,6 +105,6 @@ class patterns_Class():
 
 
 if __name__ == "__main__":
-	res = patterns_Class('sample1.doc','31c032f34f1c2561488e898c451e0666')
+	res = patterns_Class(Sample('report/31c032f34f1c2561488e898c451e0666/sample1.doc'))
 	status = res.get_Score()
 	print status
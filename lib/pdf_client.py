@@ -6,16 +6,19 @@ from startup_verify_mac import Startup_Scann
 from swf_client import swf_Class
 import re
 import logfile
+import logging
+from sample import Sample, get_md5
 
 logger = logging.getLogger('pdf')
 
 class pdf_Class():
 
-	def __init__(self, filename, md5):
-                self.filename = filename
-                self.filepath = "report/"+md5+"/"+filename
-                self.md5 = md5
-                self.reportpath = "report/"+md5+"/"+filename + "_rtf"
+	def __init__(self, sample):
+		self.sample = sample
+                self.filename = sample.name
+                self.filepath = sample.filepath
+                self.md5 = sample.md5
+                self.reportpath = "report/"+sample.md5+"/"+sample.name + "_rtf"
 
 
 	def pdf_parser(self):
@@ -47,13 +50,13 @@ class pdf_Class():
                                         self.result = 2
                                         data1 = match.group(0).split(' ')[4]
                                         os.system("mv "+data1+ " report/"+self.md5+"/")
-                                        md5_1 = hashlib.md5(open("report/"+self.md5+"/"+data1).read()).hexdigest()
+                                        md5_1 = get_md5("report/"+self.md5+"/"+data1)
                                         get_value = Startup_Scann(md5_1)
                                         status = get_value.find_mac()
                                         if status == 3:
                                                 self.result = 3
 
-                                        swf = swf_Class(self.filename, self.md5)
+                                        swf = swf_Class(self.sample)
                                         status = swf.swf_Score()
                                         if status == 3:
                                                 self.result = 3
@@ -63,5 +66,5 @@ class pdf_Class():
 		
 
 if __name__ == "__main__":
-	res = pdf_Class('pdf-jsEval.file', '31c032f34f1c2561488e898c451e0666')
+	res = pdf_Class(Sample('report/31c032f34f1c2561488e898c451e0666/pdf-jsEval.file'))
 	print res.pdf_Score()
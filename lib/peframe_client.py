@@ -3,14 +3,15 @@ import time
 import os
 import json
 from urlparse import urlparse
+from sample import Sample
 
 
 class peframe_Class():
 
-	def __init__(self, file_name, md5):
-		self.filename = file_name
-		self.filepath = "report/"+md5+"/"+file_name
-		self.reportpath = "report/"+md5+"/"+file_name+"_pe.json"
+	def __init__(self, sample):
+		self.filename = sample.name
+		self.filepath = sample.filepath
+		self.reportpath = "report/"+sample.md5+"/"+sample.name+"_pe.json"
 		self.peframe_scan()
 		self.check_sup = 1
                 self.check_clean = 1
@@ -119,5 +120,5 @@ class peframe_Class():
 		
 
 if __name__ == "__main__":
-	res = peframe_Class('malware1', '31c032f34f1c2561488e898c451e0666')
+	res = peframe_Class(Sample('report/31c032f34f1c2561488e898c451e0666/malware1'))
 	print res.get_Score()	
@@ -0,0 +1,135 @@
+import os
+import threading
+import configparser
+from multiprocessing.pool import ThreadPool
+import logfile
+import logging
+from startup import startup_report
+from startup_verify_mac import Startup_Scann
+from vt_client import vt_Class
+from startup_verify_yara import Startup_Sig
+from xor import xor_Scan
+from string_client import string_Scan
+from meta_scan import meta_Scan
+
+logger = logging.getLogger('main')
+
+
+def get_config():
+	parser = configparser.ConfigParser()
+	parser.read('config.cfg')
+	return parser
+
+
+def get_severity(status):
+	# stages report "3"/3 for malware, 2 for suspicious, 1 or 0 for clean
+	# and None when they found nothing to report
+	try:
+		return int(status)
+	except (TypeError, ValueError):
+		return 0
+
+
+def is_malware(status):
+	return get_severity(status) == 3
+
+
+def merge_status(results):
+	# worst verdict wins, so the result does not depend on stage order
+	# or on which stages were skipped after a malware verdict
+	final = 1
+	for status in results:
+		final = max(final, get_severity(status))
+	return str(final)
+
+
+class static_Pipeline():
+	def __init__(self, sample):
+		self.sample = sample
+		parser = get_config()
+		self.inprocess = parser.getboolean('analysis', 'inprocess', fallback=True)
+		self.parallel = parser.getboolean('analysis', 'parallel', fallback=False)
+		self.workers = parser.getint('analysis', 'workers', fallback=2)
+
+		self.stages = [
+			("md5_scan", self.md5_scan),
+			("vt_scan", self.vt_scan),
+			("yara_scan", self.yara_scan),
+			("xor_scan", self.xor_scan),
+			("string_scan", self.string_scan),
+			("meta_scan", self.meta_scan),
+		]
+		self.results = {}
+
+	def peframe_scan(self):
+		report = startup_report(self.sample, self.inprocess)
+		report.peframe_scan()
+
+	def md5_scan(self):
+		return Startup_Scann(self.sample.md5).find_mac()
+
+	def vt_scan(self):
+		return vt_Class(self.sample).vt_Score()
+
+	def yara_scan(self):
+		return Startup_Sig(self.sample).final_scan()
+
+	def xor_scan(self):
+		return xor_Scan(self.sample).final_results()
+
+	def string_scan(self):
+		return string_Scan(self.sample, self.inprocess).all_scan()
+
+	def meta_scan(self):
+		return meta_Scan(self.sample, self.inprocess).gen_array()
+
+	def run_serial(self):
+		results = []
+		for name, stage in self.stages:
+			status = stage()
+			logger.info("%s Analysis status : %s" % (name, status))
+			results.append((name, status))
+			if is_malware(status):
+				break
+
+		return results
+
+	def run_parallel(self):
+		# always fewer threads than stages, the ones left queued are what
+		# a malware verdict saves. the stages run in this process and
+		# share the GIL, more threads would mostly wait for it
+		cancel = threading.Event()
+		pool = ThreadPool(max(1, min(self.workers, len(self.stages) - 1)))
+
+		def run_stage(name, stage):
+			# stages still queued when a verdict arrives are skipped,
+			# stages already running are left to finish
+			if cancel.is_set():
+				logger.info("%s cancelled" % name)
+				return None
+			status = stage()
+			logger.info("%s Analysis status : %s" % (name, status))
+			if is_malware(status):
+				cancel.set()
+			return status
+
+		try:
+			pending = [pool.apply_async(run_stage, (name, stage)) for name, stage in self.stages]
+			pool.close()
+			results = [(name, res.get()) for (name, stage), res in zip(self.stages, pending)]
+		finally:
+			pool.terminate()
+
+		return results
+
+	def run(self):
+		logger.info("Generate Report for file : %s (in-process %s)" % (self.sample.name, self.inprocess))
+		self.peframe_scan()
+
+		if self.parallel:
+			results = self.run_parallel()
+		else:
+			results = self.run_serial()
+
+		self.results = dict(results)
+		return merge_status(self.results.values())
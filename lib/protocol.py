@@ -0,0 +1,134 @@
+import os
+import json
+import struct
+import socket
+
+# Connection starts with MAGIC + version byte from both sides, after
+# that every message is a frame:
+#
+#   type (1 byte) | header length (4 bytes) | body length (8 bytes)
+#   json header | body
+#
+# Bodies are streamed, they are never held in memory as a whole.
+MAGIC = "MWAP"
+VERSION = 1
+
+HELLO = 1
+SUBMIT = 2		# header: name, source_type          body: sample
+JOB = 3			# header: job, name, md5, sha256
+WAIT = 4		# header: job
+RESULT = 5		# header: job, verdict, md5           body: json report
+ERROR = 6		# header: error
+BYE = 7
+QUERY = 8		# header: sha256 list
+KNOWN = 9		# header: results {sha256: {md5, verdict}}
+WAIT_ALL = 10		# header: jobs, reports               answered by RESULT frames as
+DONE = 11		# header: count                       jobs finish, then DONE
+FETCH = 12		# header: sha256                      answered by RESULT, body the stored report
+
+FRAME = struct.Struct("!BIQ")
+BUFSIZE = 1024 * 1024
+MAX_HEADER = 1024 * 1024
+
+
+class ProtocolError(Exception):
+	pass
+
+
+def tune_socket(sock):
+	# frames are small and followed by large bodies, disable nagle so the
+	# header is not held back and give the kernel room for a full window
+	sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+	for opt in (socket.SO_SNDBUF, socket.SO_RCVBUF):
+		try:
+			sock.setsockopt(socket.SOL_SOCKET, opt, 4 * BUFSIZE)
+		except socket.error:
+			pass
+
+
+def recv_exact(sock, size):
+	chunks = []
+	while size:
+		data = sock.recv(min(size, BUFSIZE))
+		if not data:
+			raise ProtocolError("connection closed")
+		chunks.append(data)
+		size -= len(data)
+	return ''.join(chunks)
+
+
+def send_hello(sock):
+	sock.sendall(MAGIC + chr(VERSION))
+
+
+def recv_hello(sock, magic=None):
+	if magic is None:
+		magic = recv_exact(sock, len(MAGIC))
+	if magic != MAGIC:
+		raise ProtocolError("bad magic %r" % magic)
+	version = ord(recv_exact(sock, 1))
+	if version != VERSION:
+		raise ProtocolError("unsupported protocol version %d" % version)
+	return version
+
+
+def send_frame(sock, ftype, header, body='', body_size=None):
+	header = json.dumps(header)
+	if body_size is None:
+		body_size = len(body)
+	sock.sendall(FRAME.pack(ftype, len(header), body_size) + header + body)
+
+
+def recv_frame(sock):
+	# returns the type, header and body size, the caller must consume the
+	# body with recv_body/skip_body before reading the next frame
+	ftype, header_size, body_size = FRAME.unpack(recv_exact(sock, FRAME.size))
+	if header_size > MAX_HEADER:
+		raise ProtocolError("header too large (%d)" % header_size)
+	return ftype, json.loads(recv_exact(sock, header_size)), body_size
+
+
+def recv_body(sock, size):
+	while size:
+		data = sock.recv(min(size, BUFSIZE))
+		if not data:
+			raise ProtocolError("connection closed with %d bytes left" % size)
+		size -= len(data)
+		yield data
+
+
+def skip_body(sock, size):
+	for data in recv_body(sock, size):
+		pass
+
+
+def send_file(sock, f, size):
+	# zero copy when the platform has it, large writes otherwise; archive
+	# members have no file descriptor and always take the slow path
+	if hasattr(os, 'sendfile') and hasattr(f, 'fileno'):
+		offset = 0
+		while offset < size:
+			sent = os.sendfile(sock.fileno(), f.fileno(), offset, size - offset)
+			if not sent:
+				raise ProtocolError("file truncated while sending")
+			offset += sent
+		return
+
+	left = size
+	while left:
+		data = f.read(min(left, BUFSIZE))
+		if not data:
+			raise ProtocolError("file truncated while sending")
+		sock.sendall(data)
+		left -= len(data)
+
+
+def send_file_frame(sock, ftype, header, filepath):
+	with open(filepath, 'rb') as f:
+		size = os.fstat(f.fileno()).st_size
+		send_frame(sock, ftype, header, body_size=size)
+		send_file(sock, f, size)
+
+
+def send_error(sock, error):
+	send_frame(sock, ERROR, {"error": str(error)})
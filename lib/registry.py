@@ -0,0 +1,105 @@
+import os
+import time
+import threading
+import logging
+
+logger = logging.getLogger('main')
+
+CHECK_INTERVAL = 30
+
+
+def path_stamp(path):
+	if not path:
+		return None
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	return st.st_size, st.st_mtime
+
+
+def read_lines(path):
+	try:
+		with open(path) as f:
+			return f.readlines()
+	except IOError:
+		return []
+
+
+class signature_Registry():
+	# one compiled copy of every signature source per process. Loading
+	# happens before the celery pool forks, so the children start with
+	# the same read only pages; afterwards each source is rebuilt when
+	# one of its files changes and swapped in with a single assignment,
+	# callers never see a half built version
+	def __init__(self, interval=CHECK_INTERVAL):
+		self.interval = interval
+		self.entries = {}
+		self.lock = threading.Lock()
+
+	def get(self, name, paths, loader):
+		entry = self.entries.get(name)
+		if entry is not None and time.time() - entry[1] < self.interval:
+			return entry[2]
+
+		stamp = tuple(path_stamp(path) for path in paths)
+		if entry is not None and entry[0] == stamp:
+			self.entries[name] = (stamp, time.time(), entry[2])
+			return entry[2]
+
+		with self.lock:
+			entry = self.entries.get(name)
+			if entry is None or entry[0] != stamp:
+				if entry is not None:
+					logger.info("Reload signature source %s" % (name,))
+				entry = (stamp, time.time(), loader())
+				self.entries[name] = entry
+		return entry[2]
+
+	def names(self):
+		return sorted(self.entries)
+
+
+registry = signature_Registry()
+
+def get_source(name, paths, loader):
+	return registry.get(name, paths, loader)
+
+
+def preload():
+	# called in the celery parent before the pool forks
+	from ioc_engine import get_engine
+	from hash_store import get_store
+	from blocklist import get_blocklist
+	from net_index import get_ip_index, get_domain_trie
+	from yara_rules import get_bundles, get_large_size, route_groups, TYPE_RULES
+	from xor_search import get_rules
+	import startup
+
+	get_engine('data/malware_string')
+	get_engine(regex_path='data/pattern.list')
+	get_engine(regex_path='data/string_sig/malware_js')
+	get_engine('data/string_sig/malware_swf')
+	get_source('meta_string', ['data/meta_string'], lambda: read_lines('data/meta_string'))
+
+	get_store('data/unpaked_md5.list')
+	for path in ('data/ipblock.list', 'data/urlblock.list', 'data/emailblock.list', 'data/malware_url'):
+		get_blocklist(path)
+	get_ip_index('data/ipblock.list')
+	get_domain_trie('data/urlblock.list')
+	get_domain_trie('data/malware_url')
+	get_rules()
+
+	bundles = get_bundles()
+	large_size = get_large_size()
+	for filetype in TYPE_RULES.keys() + ["any"]:
+		bundles.get(route_groups(filetype, 0, large_size))
+	bundles.get(route_groups("any", large_size + 1, large_size))
+
+	startup.peframe.load_signatures()
+	logger.info("Preloaded signature sources %s" % ", ".join(str(name) for name in registry.names()))
+
+
+if __name__ == "__main__":
+	preload()
+	print registry.names()
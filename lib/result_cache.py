@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import configparser
+
+ENGINE_VERSION = "1"
+
+def yara_signatures():
+	# the files the bundles are built from, .list groups name theirs, and
+	# the quarantined namespaces left out of them
+	from yara_rules import RULE_GROUPS, group_files, get_config, get_quarantine
+	paths = []
+	for group in sorted(RULE_GROUPS):
+		paths.append(RULE_GROUPS[group])
+		try:
+			paths.extend(path for namespace, path in group_files(group))
+		except IOError:
+			pass
+	return paths, get_quarantine(get_config())
+
+
+# signature files each stage depends on, a change to any of them
+# invalidates the cached verdicts that stage took part in. a function
+# gives the paths and any other settings the stage result depends on
+STAGE_SIGNATURES = {
+	"peframe_scan": ["tools/peframe/signatures"],
+	"md5_scan": ["data/unpaked_md5.list"],
+	"vt_scan": [],
+	"yara_scan": yara_signatures,
+	"xor_scan": ["tools/xorsearch/rules.txt"],
+	"string_scan": ["data/malware_string", "data/ipblock.list", "data/urlblock.list",
+		"data/emailblock.list", "data/malware_url", "data/pattern.list", "data/string_sig"],
+	"meta_scan": ["data/meta_string"],
+}
+
+FINGERPRINT_TTL = 60
+
+fingerprint_lock = threading.Lock()
+fingerprint_cache = {"time": 0, "value": None}
+
+
+def walk_files(path):
+	if os.path.isfile(path):
+		yield path
+	for root, dirs, files in os.walk(path):
+		dirs.sort()
+		for name in sorted(files):
+			yield os.path.join(root, name)
+
+
+def fingerprint_paths(paths, settings=()):
+	# stat based, hashing every rule file on each lookup costs more
+	# than the scan we try to avoid
+	h = hashlib.sha1()
+	for value in settings:
+		h.update("%s\n" % value)
+	for path in paths:
+		for name in walk_files(path):
+			try:
+				st = os.stat(name)
+			except OSError:
+				continue
+			h.update("%s:%d:%r\n" % (name, st.st_size, st.st_mtime))
+	return h.hexdigest()
+
+
+def stage_fingerprint(stage):
+	signatures = STAGE_SIGNATURES[stage]
+	if callable(signatures):
+		return fingerprint_paths(*signatures())
+	return fingerprint_paths(signatures)
+
+
+def stage_fingerprints():
+	with fingerprint_lock:
+		if time.time() - fingerprint_cache["time"] > FINGERPRINT_TTL:
+			fingerprint_cache["value"] = dict((stage, stage_fingerprint(stage))
+				for stage in STAGE_SIGNATURES)
+			fingerprint_cache["time"] = time.time()
+		return fingerprint_cache["value"]
+
+
+def signature_version(fingerprints=None):
+	if fingerprints is None:
+		fingerprints = stage_fingerprints()
+	h = hashlib.sha1(ENGINE_VERSION)
+	for stage in sorted(fingerprints):
+		h.update("%s:%s\n" % (stage, fingerprints[stage]))
+	return h.hexdigest()
+
+
+def is_current(entry, fingerprints=None):
+	# only the stages that gave the verdict are compared, a list change
+	# leaves the entries of the other stages valid. stages skipped after
+	# a malware verdict can not change it
+	if entry["engine_version"] != ENGINE_VERSION:
+		return False
+	if fingerprints is None:
+		fingerprints = stage_fingerprints()
+	for stage in entry["stages"]:
+		if entry["signatures"].get(stage) != fingerprints.get(stage):
+			return False
+	return True
+
+
+class result_Cache():
+	def __init__(self, path):
+		self.path = path
+		dirname = os.path.dirname(path)
+		if dirname and not os.path.isdir(dirname):
+			os.makedirs(dirname)
+
+		self.lock = threading.Lock()
+		self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+		self.db.execute("PRAGMA journal_mode=WAL")
+		self.db.execute("CREATE TABLE IF NOT EXISTS results ("
+			"sha256 TEXT PRIMARY KEY, md5 TEXT, verdict TEXT, stages TEXT, "
+			"engine_version TEXT, signature_version TEXT, signatures TEXT, updated REAL)")
+		self.db.execute("CREATE INDEX IF NOT EXISTS results_md5 ON results (md5)")
+		# yara matches, valid for as long as the compiled bundle is the same
+		self.db.execute("CREATE TABLE IF NOT EXISTS yara_matches ("
+			"sha256 TEXT, bundle TEXT, matches TEXT, updated REAL, PRIMARY KEY (sha256, bundle))")
+		# when each bundle was first used and the rule groups it was built
+		# from, a newer bundle of the same groups supersedes the older ones
+		self.db.execute("CREATE TABLE IF NOT EXISTS yara_bundles ("
+			"bundle TEXT PRIMARY KEY, route TEXT, created REAL)")
+		self.db.commit()
+
+	def get_entry(self, column, value):
+		with self.lock:
+			row = self.db.execute("SELECT sha256, md5, verdict, stages, engine_version, "
+				"signature_version, signatures, updated FROM results WHERE %s = ?" % column,
+				(value,)).fetchone()
+		if not row:
+			return None
+
+		return {"sha256": row[0], "md5": row[1], "verdict": row[2], "stages": json.loads(row[3]),
+			"engine_version": row[4], "signature_version": row[5],
+			"signatures": json.loads(row[6]), "updated": row[7]}
+
+	def get(self, md5=None, sha256=None):
+		if sha256 is not None:
+			entry = self.get_entry("sha256", sha256)
+		else:
+			entry = self.get_entry("md5", md5)
+
+		if entry is None:
+			return None
+
+		if not is_current(entry):
+			self.delete(entry["sha256"])
+			return None
+
+		return entry
+
+	def put(self, sha256, md5, verdict, stages, fingerprints=None):
+		if fingerprints is None:
+			fingerprints = stage_fingerprints()
+		with self.lock:
+			self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+				(sha256, md5, str(verdict), json.dumps(stages), ENGINE_VERSION,
+				signature_version(fingerprints), json.dumps(fingerprints), time.time()))
+			self.db.commit()
+
+	def delete(self, sha256):
+		with self.lock:
+			self.db.execute("DELETE FROM results WHERE sha256 = ?", (sha256,))
+			self.db.commit()
+
+	def get_matches(self, sha256, bundle):
+		with self.lock:
+			row = self.db.execute("SELECT matches FROM yara_matches WHERE sha256 = ? AND bundle = ?",
+				(sha256, bundle)).fetchone()
+		if not row:
+			return None
+		return json.loads(row[0])
+
+	def put_matches(self, sha256, bundle, matches, groups):
+		# matches for older bundles of the same groups are never asked for
+		# again, those of other groups still are: scan_memdump.py takes its
+		# groups from the command line
+		route = ",".join(sorted(set(groups)))
+		with self.lock:
+			self.db.execute("INSERT OR IGNORE INTO yara_bundles VALUES (?, ?, ?)", (bundle, route, time.time()))
+			self.db.execute("DELETE FROM yara_matches WHERE sha256 = ? AND bundle IN ("
+				"SELECT old.bundle FROM yara_bundles old, yara_bundles new WHERE new.bundle = ? "
+				"AND old.route = new.route AND old.created < new.created)", (sha256, bundle))
+			self.db.execute("INSERT OR REPLACE INTO yara_matches VALUES (?, ?, ?, ?)",
+				(sha256, bundle, json.dumps(matches), time.time()))
+			self.db.commit()
+
+
+caches = {}
+
+def get_cache():
+	# one connection per worker process, sqlite handles must not cross a fork
+	pid = os.getpid()
+	if pid not in caches:
+		parser = configparser.ConfigParser()
+		parser.read('config.cfg')
+		caches.clear()
+		caches[pid] = result_Cache(parser.get('cache', 'path', fallback='cache/results.db'))
+	return caches[pid]
+
+
+if __name__ == "__main__":
+	res = get_cache().get(md5='d113cd13983a1633984f2a89ff1a868a')
+	print res
@@ -5,15 +5,16 @@ import json
 import re
 from startup_verify_mac import Startup_Scann
 from swf_client import swf_Class
-import hashlib
+from sample import Sample, get_md5
 
 class rtf_Class():
 
-	def __init__(self, filename, md5):
-		self.filename = filename
-		self.filepath = "report/"+md5+"/"+filename
-		self.md5 = md5
-		self.reportpath = "report/"+md5+"/"+filename + "_rtf"
+	def __init__(self, sample):
+		self.sample = sample
+		self.filename = sample.name
+		self.filepath = sample.filepath
+		self.md5 = sample.md5
+		self.reportpath = "report/"+sample.md5+"/"+sample.name + "_rtf"
 		self.rtf_scan()
 
 	def rtf_Score(self):
@@ -32,7 +33,7 @@ class rtf_Class():
 				if s:
 					docname = s.group(0)
 					os.system("mv "+docname+" report/"+self.md5+"/")
-					md5_1 = hashlib.md5(open("report/"+self.md5+"/"+docname).read()).hexdigest()
+					md5_1 = get_md5("report/"+self.md5+"/"+docname)
                                         get_value = Startup_Scann(md5_1)
                                         status = get_value.find_mac()
 					self.result = 2
@@ -48,7 +49,7 @@ class rtf_Class():
 				if s:
 					docname = s.group(0)
 					os.system("mv "+docname+" report/"+self.md5+"/")
-					md5_1 = hashlib.md5(open("report/"+self.md5+"/"+docname).read()).hexdigest()
+					md5_1 = get_md5("report/"+self.md5+"/"+docname)
                                         get_value = Startup_Scann(md5_1)
                                         status = get_value.find_mac()
 					self.result = 2
@@ -65,13 +66,13 @@ class rtf_Class():
                                         self.result = 2
                                         data1 = match.group(0).split(' ')[4]
                                         os.system("mv "+data1+ " report/"+self.md5+"/")
-                                        md5_1 = hashlib.md5(open("report/"+self.md5+"/"+data1).read()).hexdigest()
+                                        md5_1 = get_md5("report/"+self.md5+"/"+data1)
                                         get_value = Startup_Scann(md5_1)
                                         status = get_value.find_mac()
                                         if status == 3:
                                                 self.result = 3
 
-                                        swf = swf_Class(self.filename, self.md5)
+                                        swf = swf_Class(self.sample)
                                         status = swf.swf_Score()
                                         if status == 3:
                                                 self.result = 3
@@ -88,6 +89,6 @@ class rtf_Class():
 
 
 if __name__ == "__main__":
-	res = rtf_Class('rtf2.rtf','31c032f34f1c2561488e898c451e0666')
+	res = rtf_Class(Sample('report/31c032f34f1c2561488e898c451e0666/rtf2.rtf'))
 	result = res.rtf_Score()	
 	print result
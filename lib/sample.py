@@ -0,0 +1,86 @@
+import os
+import mmap
+import hashlib
+from filetype import Scan_filetype
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class Sample(object):
+	def __init__(self, filepath):
+		self.filepath = filepath
+		self.name = os.path.basename(filepath)
+		self.fd = open(filepath, 'rb')
+		self.size = os.fstat(self.fd.fileno()).st_size
+
+		# mmap can not map an empty file
+		if self.size:
+			self.data = mmap.mmap(self.fd.fileno(), 0, access=mmap.ACCESS_READ)
+		else:
+			self.data = ''
+
+		self.hashes = {}
+		self.ftype = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def close(self):
+		if self.size:
+			self.data.close()
+		self.fd.close()
+
+	def view(self, offset=0, size=None):
+		# python 2 mmap has no memoryview support, buffer() is the zero-copy slice
+		if size is None:
+			size = self.size - offset
+		return buffer(self.data, offset, size)
+
+	def chunks(self, size=CHUNK_SIZE):
+		for offset in xrange(0, self.size, size):
+			yield self.view(offset, min(size, self.size - offset))
+
+	def get_hashes(self):
+		if not self.hashes:
+			m = hashlib.md5()
+			s = hashlib.sha1()
+			s256 = hashlib.sha256()
+			for chunk in self.chunks():
+				m.update(chunk)
+				s.update(chunk)
+				s256.update(chunk)
+
+			self.hashes = {"md5": m.hexdigest(), "sha1": s.hexdigest(), "sha256": s256.hexdigest()}
+
+		return self.hashes
+
+	@property
+	def md5(self):
+		return self.get_hashes()['md5']
+
+	@property
+	def sha1(self):
+		return self.get_hashes()['sha1']
+
+	@property
+	def sha256(self):
+		return self.get_hashes()['sha256']
+
+	@property
+	def filetype(self):
+		if self.ftype is None:
+			self.ftype = Scan_filetype(self.filepath, self.md5).get_filetype()
+		return self.ftype
+
+
+def get_md5(filepath):
+	with Sample(filepath) as sample:
+		return sample.md5
+
+
+if __name__ == "__main__":
+	with Sample('sample1.doc') as res:
+		print res.md5, res.sha256, res.filetype
@@ -7,53 +7,54 @@ from js_client import js_Class
 from rtf_client import rtf_Class
 from pdf_client import pdf_Class
 from peframe_client import peframe_Class
+from html_client import html_Class
+from sample import Sample
 
 class scan_File():
-	def __init__(self, filename, md5, filetype):
-		self.filename = filename
-		self.md5 = md5
-		self.filetype = filetype
+	def __init__(self, sample):
+		self.sample = sample
+		self.filetype = sample.filetype
 
 	def get_results(self):
 		if self.filetype == "swf":
-			swf = swf_Class(self.filename, self.md5)
+			swf = swf_Class(self.sample)
 			status = swf.swf_Score()
 			return status
 	
 		if self.filetype == "msdos" or self.filetype == "excel" or self.filetype == "ppt":
-			ole = ole_Class(self.filename, self.md5)
+			ole = ole_Class(self.sample)
 			status = ole.ole_Score()
 			return status
 
 		if self.filetype == "rtf":
-			rtf = rtf_Class(self.filename, self.md5)
+			rtf = rtf_Class(self.sample)
         		status = rtf.rtf_Score()
 			return status
 			
 		if self.filetype == "pdf":
-			pdf = pdf_Class(self.filename, self.md5)
+			pdf = pdf_Class(self.sample)
         		status = pdf.pdf_Score()
 			return status
 			
 		if self.filetype == "dll" or self.filetype == "exe":
-			pe = peframe_Class(self.filename, self.md5)
+			pe = peframe_Class(self.sample)
         		status = pe.get_Score()
 			return status
 
 		if self.filetype == "plain" or self.filetype == "js":
-	 		js = js_Class(self.filename, self.md5)
+	 		js = js_Class(self.sample)
         		status = js.js_Score()
 			return status
 		
 		if self.filetype == "plain" or self.filetype == "html":
-			html = html_Class(self.filename, self.md5, None)
+			html = html_Class(self.sample, None)
         		status = html.html_Score()
 
 				
 
 
 if __name__ == "__main__":
-	res = scan_File('swf-js.file', '31c032f34f1c2561488e898c451e0666', 'swf')
+	res = scan_File(Sample('report/31c032f34f1c2561488e898c451e0666/swf-js.file'))
 	print res.get_results()
 
 
@@ -1,20 +1,32 @@
 import subprocess
 import time
 import os
+import sys
 import json
 from urlparse import urlparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools', 'peframe'))
+import peframe
+
 
 class startup_report(object):
 
-        def __init__(self, filepath, md5):
-                self.report_name = md5 + ".json"
-		self.filepath = filepath
-		self.md5 = md5
+        def __init__(self, sample, inprocess=True):
+                self.report_name = sample.md5 + ".json"
+		self.sample = sample
+		self.filepath = sample.filepath
+		self.md5 = sample.md5
+		self.inprocess = inprocess
 
         def peframe_scan(self):
-                os.system("python tools/peframe/peframe.py --json  " + self.filepath + " > report/"+self.md5+"/"+ self.report_name )
+		if self.inprocess:
+			with open("report/"+self.md5+"/"+ self.report_name, 'w') as f:
+				f.write(peframe.get_json(self.filepath, self.sample))
+				f.write("\n")
+		else:
+                	os.system("python tools/peframe/peframe.py --json  " + self.filepath + " > report/"+self.md5+"/"+ self.report_name )
 
 if __name__ == "__main__":
-	res = startup_report("sample.pdf", "d113cd13983a1633984f2a89ff1a868a")
+	from sample import Sample
+	res = startup_report(Sample("sample.pdf"))
 	res.peframe_scan()
@@ -1,6 +1,7 @@
 import os
 import sys
 import MySQLdb
+from hash_store import get_store
 
 
 class Startup_Scann():
@@ -11,7 +12,8 @@ class Startup_Scann():
 
 	
 	def find_mac(self):
-		if self.md5 in open(self.file_name).read():
+		# md5, sha1 or sha256, whole hash match against the indexed list
+		if get_store(self.file_name).contains(self.md5):
    	 		result = "3"
 		else:
 			result = "1"
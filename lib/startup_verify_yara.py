@@ -1,138 +1,66 @@
 import os
 import sys
 import time
-import MySQLdb
+import logging
+from sample import Sample
+from yara_rules import get_bundles, get_config, get_timeout, get_large_size, get_chunk_size, get_max_overlap, route_groups
+from yara_scan import scan_windows, sample_windows, cached_scan
+from yara_profile import rule_Profile
 
+logger = logging.getLogger('main')
 
-class Startup_Sig():
-	def __init__(self, file_name, filetype):
-		self.file_name = file_name
-		self.report_name = file_name + ".tmp"
-		self.filetype = filetype
-		self.lock = True
-
-        def jpeg_scan(self):
-                os.system("/usr/local/bin/yara -w -m data/filetype/jpeg.yara " + self.file_name + " > "+ self.report_name)
-                if os.path.getsize(self.report_name) != 0:
-   	 		result = "3"
-		else:
-			result = "1"
-		return result
 
-        def antivm_scan(self):
-                os.system("/usr/local/bin/yara -w -m data/antivm.yara " + self.file_name + " > "+ self.report_name)
-                if os.path.getsize(self.report_name) != 0:
-   	 		result = "3"
-		else:
-			result = "1"
-		return result
+class Startup_Sig():
+	def __init__(self, sample):
+		self.sample = sample
+		self.file_name = sample.filepath
+		self.filetype = sample.filetype
+		self.matches = []
+
+	def get_groups(self):
+		return route_groups(self.filetype, self.sample.size, get_large_size())
+
+	def scan(self):
+		# one pass with every namespace over the mapped sample, samples
+		# larger than a chunk are matched in overlapping windows
+		bundles = get_bundles()
+		groups = self.get_groups()
+		digest, rules = bundles.get(groups)
+
+		def run():
+			chunk_size = get_chunk_size()
+			if self.sample.size > chunk_size:
+				overlap = bundles.overlap(groups, get_max_overlap())
+				windows = sample_windows(self.sample, chunk_size, overlap)
+			else:
+				windows = [(0, self.sample.data)]
+			return scan_windows(rules, windows, get_timeout())
 
+		self.matches = cached_scan(self.sample.sha256, digest, groups, run)
 
-        def clamav_scan(self):
-                os.system("/usr/local/bin/yara -w -m data/clamav/main.yara " + self.file_name + " > "+ self.report_name)
-                if os.path.getsize(self.report_name) != 0:
-   	 		result = "3"
-		else:
-			result = "1"
-		return result
+		if get_config().getboolean('yara', 'profile', fallback=False):
+			self.profile()
+		return self.matches
 
-        def pdf_scan(self):
-                os.system("/usr/local/bin/yara -w -m data/filetype/pdf.yara " + self.file_name + " > "+ self.report_name)
-                if os.path.getsize(self.report_name) != 0:
-   	 		result = "3"
-		else:
-			result = "1"
-		return result
+	def profile(self):
+		# per rule file timings for this sample, next to its other reports,
+		# with the rule files compiled once per worker
+		profile = rule_Profile(rules=get_bundles().split(self.get_groups()))
+		for namespace, matches in profile.scan_profiling(self.sample.data, get_timeout()):
+			pass
+		profile.write_report("report/"+self.sample.md5+"/yara_profile.csv")
 
-        def doc_scan(self):
-                os.system("/usr/local/bin/yara -w -m data/filetype/doc.yara " + self.file_name + " > "+ self.report_name)
-                if os.path.getsize(self.report_name) != 0:
-   	 		result = "3"
-		else:
-			result = "1"
-		return result
-
-        def exe_scan(self):
-                os.system("/usr/local/bin/yara -w -m data/filetype/exe.yara " + self.file_name + " > "+ self.report_name)
-                if os.path.getsize(self.report_name) != 0:
-   	 		result = "3"
+	def final_scan(self):
+		if self.scan():
+			for match in self.matches:
+				logger.info("yara match %s:%s on %s" % (match["namespace"], match["rule"], self.file_name))
+			result = "3"
 		else:
 			result = "1"
-		return result
-
-        def operational_scan(self):
-		with open('data/Operation_Blockbuster/yara.list') as f:
-			array = f.read().splitlines()
 
-		for yara_name in array:
-                	os.system("/usr/local/bin/yara -w -m data/Operation_Blockbuster/"+ yara_name +" "+ self.file_name + " > "+ self.report_name)
-                	if os.path.getsize(self.report_name) != 0:
-   	 			result = "3"
-				break
-			else:
-				result = "1"
 		return result
 
-        def malware_scan(self):
-		with open('data/malware/yara.list') as f:
-			array = f.read().splitlines()
-
-		for yara_name in array:
-                	os.system("/usr/local/bin/yara -w -m data/malware/"+ yara_name +" "+ self.file_name + " > "+ self.report_name)
-                	if os.path.getsize(self.report_name) != 0:
-   	 			result = "3"
-				break
-			else:
-				result = "1"
-
-		return result
-
-        def mobile_scan(self):
-		with open('data/mobile/yara.list') as f:
-			array = f.read().splitlines()
-
-		for yara_name in array:
-                	os.system("/usr/local/bin/yara -w -m data/mobile/"+ yara_name +" "+ self.file_name + " > "+ self.report_name)
-                	if os.path.getsize(self.report_name) != 0:
-   	 			result = "3"
-			else:
-				result = "1"
-		return result
-	
-	def final_scan(self):
-		if self.lock == True:
-			res = self.clamav_scan()
-			if res == "3":
-				self.lock = False
-		if self.lock == True:
-			res = self.malware_scan()
-			if res == "3":
-				self.lock = False
-		if self.lock == True:
-                        res = self.operational_scan()
-                        if res == "3":
-                                self.lock = False
-		if self.lock == True:
-			res = self.antivm_scan()
-			if res == "3":
-				self.lock = False
-		if self.lock == True:
-			if self.filetype == "msdoc" or self.filetype == "any":
-				res = self.doc_scan()
-			if self.filetype == "exe" or self.filetype == "any":
-				res = self.exe_scan()
-			if self.filetype == "pdf" or self.filetype == "any":
-				res = self.pdf_scan()
-			if self.filetype == "jpeg" or self.filetype == "any":
-				res = self.jpeg_scan()
-			if self.filetype == "android" or self.filetype == "any":
-				res = self.mobile_scan()
- 
-		return res
-		
 
 if __name__ == "__main__":
-	res = Startup_Sig('jayesh', 'doc').final_scan()
+	res = Startup_Sig(Sample('jayesh')).final_scan()
 	print res
-
-
@@ -3,67 +3,69 @@ import os
 import sys
 import re
 from urlparse import urlparse
+from sample import Sample
+from blocklist import get_blocklist
+from net_index import get_ip_index, get_domain_trie
+from ioc_engine import get_engine
+from string_extract import iter_strings
 
 class string_Scan():
-	def __init__(self, filepath, md5):
-		self.filepath = filepath
-		self.md5 = str(md5)
+	def __init__(self, sample, inprocess=True):
+		self.sample = sample
+		self.filepath = sample.filepath
+		self.md5 = str(sample.md5)
+		self.inprocess = inprocess
 		self.status = 1 
 		self.get_details()
 		self.ips = []
 		self.status = 1
 
 	def get_details(self):
-		os.system("strings "+ self.filepath + " > report/"+self.md5+"/string.info")
+		if self.inprocess:
+			# ascii and utf-16 strings in one pass, written as they are found
+			with open("report/"+self.md5+"/string.info", 'w') as f:
+				for offset, encoding, text in iter_strings(self.sample.data):
+					f.write(text + "\n")
+		else:
+			os.system("strings "+ self.filepath + " > report/"+self.md5+"/string.info")
 
 	def find_string(self):
-                with open("report/"+self.md5+"/string.info", 'r') as f:
-                        fdata = f.read().rstrip()
-			for line in fdata:
-                        	datafile = file('data/malware_string')
-                        	for line in datafile:
-                        		self.status = 2
-               	return self.status 
+		with open("report/"+self.md5+"/string.info", 'r') as f:
+			fdata = f.read()
+
+		# every malware string in one pass over the extracted strings
+		if get_engine('data/malware_string').search(fdata):
+			self.status = 2
+		return self.status
 
 
 	def find_ip(self):
-                with open("report/"+self.md5+"/string.info", 'r') as f:
-                        fdata = f.read().rstrip()
+		with open("report/"+self.md5+"/string.info", 'r') as f:
+			fdata = f.read().rstrip()
 
-                ips = re.findall(r"\d{1,3}(?:\.\d{1,3}){3}", fdata)
-                for ip in ips:
-                        datafile = file('data/ipblock.list')
-                        for line in datafile:
-                                if ip in line:
-                                        self.status = 3
+		ipblock = get_ip_index('data/ipblock.list')
+		ips = re.findall(r"\d{1,3}(?:\.\d{1,3}){3}", fdata)
+		for ip in set(ips):
+			if ipblock.contains(ip):
+				self.status = 3
 
-                return self.status
+		return self.status
 
 
 	def find_url(self):
-		check = True
 		with open("report/"+self.md5+"/string.info", 'r') as myfile:
-        		data=myfile.read().replace('\n', '')
-
-                urls = re.findall('http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', data)
-
-                for url in urls:
-                        o = urlparse(url)
-                        url_full = o.geturl()
-                        domain = o.netloc
-			
-                        datafile = file('data/urlblock.list')
-                        for line in datafile:
-                                if url_full in line:
-                                        self.status = 3
-					check = False
-			if check:
-                        	datafile = file('data/urlblock.list')
-                        	for line in datafile:
-                                	if domain in line:
-						self.status = 3
-
-                return self.status
+			data=myfile.read().replace('\n', '')
+
+		blocklist = get_blocklist('data/urlblock.list')
+		domains = get_domain_trie('data/urlblock.list')
+		urls = re.findall('http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', data)
+
+		for url in set(urls):
+			o = urlparse(url)
+			if blocklist.contains(o.geturl()) or domains.contains(o.hostname):
+				self.status = 3
+
+		return self.status
 
 	def all_scan(self):
 		final_status = []
@@ -93,7 +95,7 @@ class string_Scan():
 
 
 if __name__ == "__main__":
-	res = string_Scan('/home/versa/task/sample1.doc', 'acc9f0271432b4d14e0fe4913dc8e62e')
+	res = string_Scan(Sample('/home/versa/task/sample1.doc'))
 #	match = re.search(r'(\d+-\d+-\d+)','Creation date: 2000-11-24 03:32:13')
 #	date =  match.group(1)
 	print res.all_scan() 
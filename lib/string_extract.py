@@ -0,0 +1,81 @@
+import re
+
+CHUNK_SIZE = 1024 * 1024
+PRINTABLE = r'[\t\x20-\x7e]'
+
+patterns = {}
+
+
+def get_pattern(min_length, encodings):
+	# utf-16 first, at the start of a wide run the ascii branch fails
+	# after one character anyway. An ascii run stops before a character
+	# that starts a wide run, or it would take that character with it
+	key = (min_length, tuple(encodings))
+	if key not in patterns:
+		wide = r'(?:%s\x00){%d}' % (PRINTABLE, min_length)
+		branches = []
+		if "utf-16le" in encodings:
+			branches.append(r'(?P<wide>%s(?:%s\x00)*)' % (wide, PRINTABLE))
+		if "ascii" in encodings and "utf-16le" in encodings:
+			branches.append(r'(?P<ascii>(?:(?!%s)%s){%d,})' % (wide, PRINTABLE, min_length))
+		elif "ascii" in encodings:
+			branches.append(r'(?P<ascii>%s{%d,})' % (PRINTABLE, min_length))
+		patterns[key] = re.compile("|".join(branches))
+	return patterns[key]
+
+
+def make_record(match, base):
+	if match.lastgroup == "wide":
+		return base + match.start(), "utf-16le", match.group().decode("utf-16le").encode("utf-8")
+	return base + match.start(), "ascii", match.group()
+
+
+def iter_strings(data, min_length=4, encodings=("ascii", "utf-16le"), base=0):
+	# (offset, encoding, text) for every run in one regex pass, data can
+	# be a str, buffer or mmap and is never copied
+	for match in get_pattern(min_length, encodings).finditer(data):
+		yield make_record(match, base)
+
+
+def iter_file_strings(f, min_length=4, encodings=("ascii", "utf-16le"), chunk_size=CHUNK_SIZE):
+	# same records from a stream. Where a run stops can depend on the
+	# min_length wide characters after it, so a run ending that close to
+	# the end of a chunk is held back and completed with the next one
+	pattern = get_pattern(min_length, encodings)
+	margin = 2 * min_length + 2
+	base = 0
+	emitted = 0
+	carry = ''
+	while True:
+		chunk = f.read(chunk_size)
+		data = carry + chunk
+		if not data:
+			break
+
+		keep = len(data)
+		for match in pattern.finditer(data):
+			if chunk and match.end() > len(data) - margin:
+				keep = match.start()
+				break
+			# the carried tail may hold the end of a run already emitted
+			if base + match.start() < emitted:
+				continue
+			emitted = base + match.end()
+			yield make_record(match, base)
+
+		if not chunk:
+			break
+		# a run shorter than min_length may still grow into the next chunk
+		keep = min(keep, max(0, len(data) - margin))
+		carry = data[keep:]
+		base += keep
+
+
+def strings_text(records):
+	for offset, encoding, text in records:
+		yield text
+
+
+if __name__ == "__main__":
+	for record in iter_strings("MZ\x90\x00This program\x00\x00K\x00e\x00r\x00n\x00e\x00l\x00"):
+		print record
@@ -4,15 +4,18 @@ import os
 import json
 from urlparse import urlparse
 import re
+from sample import Sample
+from blocklist import get_blocklist
+from net_index import get_domain_trie
+from ioc_engine import get_engine
 
 
 class swf_Class():
 
-	def __init__(self, file_name, md5):
-		self.file_name = "report/"+md5+"/"+file_name
-		self.report_name = "report/"+md5+"/"+file_name + "_swf.report"
-		with open('data/string_sig/malware_swf') as malware:
-                        self.malw=malware.read().splitlines()
+	def __init__(self, sample):
+		self.file_name = sample.filepath
+		self.report_name = "report/"+sample.md5+"/"+sample.name + "_swf.report"
+		self.malw = get_engine('data/string_sig/malware_swf')
 		self.res = self.swf_scan()
 
 	def swf_Score(self):
@@ -32,41 +35,31 @@ class swf_Class():
 		self.check = True
 		os.system("swfdump -D " + self.file_name + " > "+ self.report_name)
 		
-		for mal in self.malw:
-			datafile = file(self.report_name)
-			found = False
-			for line in datafile:
-				if mal in line:
-					self.score = 3
-
 		with open(self.report_name, 'r') as myfile:
-        		data=myfile.read().replace('\n', '')
+			dump = myfile.read()
 
-		urls = re.findall('http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', data)
+		# all malware strings in one pass over the dump
+		if self.malw.search(dump):
+			self.score = 3
 
-		for url in urls:
-        		o = urlparse(url)
-        		self.url_full = o.geturl()
-        		self.domain = o.netloc
+		data = dump.replace('\n', '')
+
+		urls = re.findall('http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', data)
 
-			datafile = file('data/malware_url')
-			found = False
-			for line in datafile:
-				if self.url_full in line:
-					self.score = 3
-					self.check = False
+		blocklist = get_blocklist('data/malware_url')
+		domains = get_domain_trie('data/malware_url')
+		for url in set(urls):
+			o = urlparse(url)
+			self.url_full = o.geturl()
+			self.domain = o.netloc
 
-			if self.check == True:
-				datafile = file('data/malware_url')
-				found = False
-				for line in datafile:
-					if self.domain in line:
-						self.score = 3
+			if blocklist.contains(self.url_full) or domains.contains(o.hostname):
+				self.score = 3
 
 
 		return self.score
 
 if __name__ == "__main__":
-	res = swf_Class('swf-js.file', '31c032f34f1c2561488e898c451e0666')
+	res = swf_Class(Sample('report/31c032f34f1c2561488e898c451e0666/swf-js.file'))
 	status = res.swf_Score()
 	print status	
@@ -3,25 +3,21 @@ import time
 import os
 import os.path
 import json
+from sample import Sample
 
 class vt_Class():
 
-	def __init__(self, file_name, md5):
-		self.file_name = file_name
-		self.md5 = md5
+	def __init__(self, sample):
+		self.sample = sample
+		self.file_name = sample.filepath
+		self.md5 = sample.md5
 		self.configfile = self.virus_total()
 		print "config file %s" %self.configfile
-        	self.file_sha = subprocess.check_output("sha1sum "+ self.file_name +" | awk '{print $1}'", shell=True)
-        	self.file_sha_name = self.file_sha.split('\n')
-        	self.filename="VTDL_"+self.file_sha_name[0]+".json" 
 
 	def virus_total(self):
+		self.filename="VTDL_"+self.sample.sha1+".json" 
         	os.system("python tools/VirusTotalApi-master/vt/vt.py -j -f " + self.file_name)
-		if os.path.isfile(self.file_name):
-        		self.file_sha = subprocess.check_output("sha1sum "+ self.file_name +" | awk '{print $1}'", shell=True)
-        		self.file_sha_name = self.file_sha.split('\n')
-        		self.filename="VTDL_"+self.file_sha_name[0]+".json" 
-		else:
+		if not os.path.isfile(self.file_name):
         		os.system("touch "+ self.filename)
 			
 		return self.filename
@@ -43,6 +39,6 @@ class vt_Class():
 		
 
 if __name__ == "__main__":
-        res = vt_Class('/tmp/sample1.doc', '36abd162e5b6a4549500881f3d954886')
+        res = vt_Class(Sample('/tmp/sample1.doc'))
         print res.vt_Score()
 
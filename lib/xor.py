@@ -2,16 +2,48 @@ import magic
 import os
 import sys
 import re
+import configparser
+from sample import Sample
+import xor_search
+from xor_search import WINDOW, search, search_pe, get_rules
+
+
+def get_config():
+	parser = configparser.ConfigParser()
+	parser.read('config.cfg')
+	return parser
+
+
+def write_report(results, path):
+	# the lines xorsearch printed, get_details greps them
+	with open(path, 'w') as f:
+		for transform, key, offset, rule in results:
+			if transform == "ROT":
+				f.write("Found %s %02d position %08X: %s\n" % (transform, key, offset, rule))
+			else:
+				f.write("Found %s %02X position %08X: %s\n" % (transform, key, offset, rule))
+
 
 class xor_Scan():
-	def __init__(self, filepath, md5):
-		self.filepath = filepath
-		self.md5 = str(md5)
+	def __init__(self, sample):
+		self.sample = sample
+		self.filepath = sample.filepath
+		self.md5 = str(sample.md5)
 		self.status = 1 
 
 	def scan_file(self):
-		os.system("tools/xorsearch/xorsearch -h "+ self.filepath + " 50450000 > report/"+self.md5+"/pe_attach.info")
-		os.system("tools/xorsearch/xorsearch -W "+ self.filepath + " > report/"+self.md5+"/xor.info")
+		if xor_search.numpy is None:
+			os.system("tools/xorsearch/xorsearch -h "+ self.filepath + " 50450000 > report/"+self.md5+"/pe_attach.info")
+			os.system("tools/xorsearch/xorsearch -W "+ self.filepath + " > report/"+self.md5+"/xor.info")
+			return
+
+		# every xor, rol, rot and add key in process over the mapped
+		# sample, see xor_search
+		window = get_config().getint('xor', 'window', fallback=WINDOW)
+		self.pe_results = search_pe(self.sample.data, window=window)
+		self.results = search(self.sample.data, get_rules(), window=window)
+		write_report(self.pe_results, "report/"+self.md5+"/pe_attach.info")
+		write_report(self.results, "report/"+self.md5+"/xor.info")
 
 	def get_pedetails(self):
 		if os.path.getsize("report/"+self.md5+"/pe_attach.info") != 0:
@@ -53,6 +85,6 @@ class xor_Scan():
 
 
 if __name__ == "__main__":
-	res = xor_Scan('/home/versa/malware1', 'acc9f0271432b4d14e0fe4913dc8e62e')
+	res = xor_Scan(Sample('/home/versa/malware1'))
 	print res.final_results() 
 
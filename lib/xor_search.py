@@ -0,0 +1,306 @@
+import string
+import logging
+from registry import get_source
+
+logger = logging.getLogger('main')
+
+# without numpy xor_Scan runs the xorsearch binary instead, a search
+# per key in python is ten times slower than it
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+RULES = "tools/xorsearch/rules.txt"
+# candidate starts handled at once, the data itself stays mapped and only
+# the arrays for one window are allocated
+WINDOW = 1024 * 1024
+
+MODE_BYTE = 0
+MODE_BITS = 1
+MODE_JUMP = 2
+# not in the rule syntax, e_lfanew of the MZ header points at PE\0\0
+MODE_PE = 3
+
+PE_SIGNATURE = "PE\0\0"
+DOS_STUB = "This program cannot be run in DOS mode"
+
+
+def xor_table(key):
+	return ''.join(chr(c ^ key) for c in range(256))
+
+def rol_table(key):
+	return ''.join(chr((c << key | c >> (8 - key)) & 0xff) for c in range(256))
+
+def rot_table(key):
+	# xorsearch counts ROT down from 25, key n undoes a rotation by n
+	table = map(chr, range(256))
+	for first in ('a', 'A'):
+		for i in range(26):
+			table[ord(first) + i] = chr(ord(first) + (i + 26 - key) % 26)
+	return ''.join(table)
+
+def add_table(key):
+	return ''.join(chr((c + key) & 0xff) for c in range(256))
+
+
+class xor_Transform():
+	# one xorsearch encoding with a decode table per key, in the order
+	# xorsearch tries them. xor and add include key 0, the plain data, as
+	# xorsearch does. delta, when given, is the same for two decoded
+	# bytes as for the raw ones whatever the key
+	def __init__(self, name, keys, table, delta=None):
+		self.name = name
+		self.delta = delta
+		self.keys = list(keys)
+		self.rank = dict((key, i) for i, key in enumerate(self.keys))
+		self.tables = dict((key, table(key)) for key in self.keys)
+		self.encode = dict((key, string.maketrans(self.tables[key], string.maketrans('', '')))
+			for key in self.keys)
+		self.inverse = {}
+		self.array = None
+		if numpy is not None:
+			self.array = numpy.zeros((max(self.keys) + 1, 256), dtype=numpy.uint8)
+			for key in self.keys:
+				self.array[key] = numpy.frombuffer(self.tables[key], dtype=numpy.uint8)
+
+	def first_keys(self, byte):
+		# lookups raw byte -> key decoding it to byte, -1 for none. xor
+		# and add have one key per raw byte, rol and rot may have several
+		if byte not in self.inverse:
+			keys = [[] for c in range(256)]
+			for key in self.keys:
+				keys[ord(self.encode[key][byte])].append(key)
+			self.inverse[byte] = [numpy.array([k[i] if i < len(k) else -1 for k in keys], dtype=numpy.int16)
+				for i in range(max(len(k) for k in keys))]
+		return self.inverse[byte]
+
+
+TRANSFORMS = [
+	xor_Transform("XOR", range(0, 256), xor_table, lambda a, b: a ^ b),
+	xor_Transform("ROL", range(1, 8), rol_table),
+	xor_Transform("ROT", range(25, 0, -1), rot_table),
+	xor_Transform("ADD", range(1, 256) + [0], add_table, lambda a, b: (b - a) & 0xff),
+]
+
+
+class xor_Rule():
+	def __init__(self, name, score, wildcards):
+		self.name = name
+		self.score = score
+		self.wildcards = wildcards
+		# leading fixed bytes, what the candidates are looked up by
+		self.prefix = ''
+		for wildcard in wildcards:
+			if wildcard[0] != MODE_BYTE:
+				break
+			self.prefix += chr(wildcard[1])
+
+
+def parse_bits(bits):
+	# same reading as ParseBits of xorsearch: a letter names a variable
+	# that must hold the same value wherever it appears, a ? after a
+	# letter widens that variable and is a plain wildcard before any
+	mask = value = 0
+	variables = []
+	for i, c in enumerate(bits):
+		bit = 1 << (7 - i)
+		if c in '01':
+			mask |= bit
+			if c == '1':
+				value |= bit
+		elif c == '?':
+			if variables:
+				variables[-1][1] |= bit
+		elif 'A' <= c <= 'Z' and len(variables) < 2:
+			variables.append([c, bit])
+		else:
+			raise ValueError("bad bits %r" % bits)
+	return (MODE_BITS, mask, value, [(name, bits_mask, len(bin(bits_mask & -bits_mask)) - 3)
+		for name, bits_mask in variables])
+
+
+def parse_wildcards(text):
+	if text.startswith("str=") and len(text) > 4:
+		return [(MODE_BYTE, ord(c)) for c in text[4:]]
+
+	wildcards = []
+	i = 0
+	while i < len(text):
+		if len(text[i:i + 2]) == 2 and all(c in string.hexdigits for c in text[i:i + 2]):
+			wildcards.append((MODE_BYTE, int(text[i:i + 2], 16)))
+			i += 2
+		elif text.startswith("(B;", i) and text[i + 11:i + 12] == ")":
+			wildcards.append(parse_bits(text[i + 3:i + 11]))
+			i += 12
+		elif text.startswith("(J;", i) and text[i + 3:i + 4] in ("1", "4") and text[i + 4:i + 5] == ")":
+			wildcards.append((MODE_JUMP, int(text[i + 3])))
+			i += 5
+		else:
+			raise ValueError("bad wildcard at %r" % text[i:])
+	if not wildcards or wildcards[0][0] != MODE_BYTE:
+		raise ValueError("rule has to start with a byte")
+	return wildcards
+
+
+def load_rules(path=RULES):
+	# name:score:rule lines, see xorsearch -h
+	rules = []
+	with open(path) as f:
+		for line in f:
+			line = line.strip()
+			if not line or line.startswith('#'):
+				continue
+			parts = line.split(":")
+			try:
+				if len(parts) != 3:
+					raise ValueError("expected name:score:rule")
+				rules.append(xor_Rule(parts[0], int(parts[1]), parse_wildcards(parts[2])))
+			except ValueError as e:
+				logger.error("bad xorsearch rule %r : %s" % (line, e))
+	return rules
+
+
+def get_rules(path=RULES):
+	return get_source(("xor_rules", path), [path], lambda: load_rules(path))
+
+
+PE_RULES = [
+	xor_Rule("Embedded PE", 0, [(MODE_BYTE, 0x4D), (MODE_BYTE, 0x5A), (MODE_PE,)]),
+	xor_Rule("Embedded PE", 0, parse_wildcards("str=" + DOS_STUB)),
+]
+
+
+def numpy_decode(raw, table, found, at):
+	return table[found["key"], raw[at]].astype(numpy.int64)
+
+
+def numpy_keep(found, ok):
+	for name in found:
+		found[name] = found[name][ok]
+	return len(found["offset"])
+
+
+def numpy_match(raw, size, table, wildcards, found):
+	# the WildcardSearch loop of xorsearch for all candidates of a window
+	# at once, bytes are decoded as they are read and every step drops
+	# the candidates that failed it
+	found["position"] = numpy.ones(len(found["offset"]), dtype=numpy.int64)
+	for wildcard in wildcards[1:]:
+		mode = wildcard[0]
+		if mode == MODE_JUMP:
+			width = wildcard[1]
+			if not numpy_keep(found, found["offset"] + found["position"] + width <= size):
+				break
+			at = found["offset"] + found["position"]
+			jump = numpy.zeros(len(at), dtype=numpy.int64)
+			for i in range(width):
+				jump |= numpy_decode(raw, table, found, at + i) << (8 * i)
+			jump -= (jump >> (8 * width - 1)) << (8 * width)
+			found["position"] += width + jump
+			at = found["offset"] + found["position"]
+			if not numpy_keep(found, (at >= 0) & (at < size)):
+				break
+		elif mode == MODE_PE:
+			if not numpy_keep(found, found["offset"] + 0x40 <= size):
+				break
+			at = found["offset"].copy()
+			for i in range(4):
+				at += numpy_decode(raw, table, found, found["offset"] + 0x3C + i) << (8 * i)
+			found["pe"] = at
+			if not numpy_keep(found, at + 4 <= size):
+				break
+			for i, c in enumerate(PE_SIGNATURE):
+				if not numpy_keep(found, numpy_decode(raw, table, found, found["pe"] + i) == ord(c)):
+					break
+		else:
+			if not numpy_keep(found, found["offset"] + found["position"] < size):
+				break
+			c = numpy_decode(raw, table, found, found["offset"] + found["position"])
+			if mode == MODE_BYTE:
+				ok = c == wildcard[1]
+			else:
+				ok = c & wildcard[1] == wildcard[2]
+				for name, mask, shift in wildcard[3]:
+					if name in found:
+						ok &= found[name] == (c & mask) >> shift
+					else:
+						found[name] = (c & mask) >> shift
+			found["position"] += 1
+			if not numpy_keep(found, ok):
+				break
+	return zip(found["key"].tolist(), found["offset"].tolist())
+
+
+def numpy_candidates(raw, start, chunk, deltas, transform, prefix):
+	# the key of a candidate follows from its first byte, so every key
+	# of the transform is searched in the same pass over the window
+	slots = transform.first_keys(ord(prefix[0]))
+	if len(prefix) > 1:
+		offsets = numpy.flatnonzero(deltas == transform.delta(ord(prefix[0]), ord(prefix[1])))
+	else:
+		offsets = numpy.flatnonzero(slots[0][chunk] >= 0)
+	values = chunk[offsets]
+
+	candidates = []
+	for first in slots:
+		keys = first[values]
+		candidates.append({"key": keys[keys >= 0], "offset": offsets[keys >= 0] + start})
+	return candidates
+
+
+def numpy_search(data, size, rules, transform, window):
+	raw = numpy.frombuffer(data, dtype=numpy.uint8)
+	for start in xrange(0, size, window):
+		chunk = raw[start:start + window]
+		deltas = None
+		if transform.delta is not None:
+			# pairs with the first byte of the next window included
+			following = raw[start + 1:start + window + 1]
+			deltas = transform.delta(chunk[:len(following)], following)
+
+		# rules starting with the same bytes share their candidates
+		candidates = {}
+		for rule in rules:
+			prefix = rule.prefix[:2 if deltas is not None else 1]
+			if prefix not in candidates:
+				candidates[prefix] = numpy_candidates(raw, start, chunk, deltas, transform, prefix)
+			for found in candidates[prefix]:
+				for key, offset in numpy_match(raw, size, transform.array, rule.wildcards, dict(found)):
+					yield key, offset, rule
+
+
+def search(data, rules=None, transforms=None, window=WINDOW):
+	"""
+	[(transform, key, offset, rule name)] for every place a rule matches
+	the data decoded with one of the keys, in the order xorsearch prints
+	them. data can be a str, buffer or mmap and is never decoded whole
+	"""
+	if numpy is None:
+		raise ImportError("xor_search needs numpy")
+	if rules is None:
+		rules = get_rules()
+	size = len(data)
+	if not size or not rules:
+		return []
+
+	index = dict((rule, i) for i, rule in enumerate(rules))
+	results = []
+	for transform in transforms or TRANSFORMS:
+		found = numpy_search(data, size, rules, transform, window)
+		for key, offset, rule in sorted(found, key=lambda (key, offset, rule): (transform.rank[key], index[rule], offset)):
+			results.append((transform.name, key, offset, rule.name))
+	return results
+
+
+def search_pe(data, transforms=None, window=WINDOW):
+	# MZ header whose e_lfanew points at PE\0\0, or the dos stub
+	return search(data, PE_RULES, transforms, window)
+
+
+if __name__ == "__main__":
+	import sys
+	with open(sys.argv[1], 'rb') as f:
+		data = f.read()
+	for result in search_pe(data) + search(data, load_rules()):
+		print "Found %s %02X position %08X: %s" % result
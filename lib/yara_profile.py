@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import yara
+import argparse
+from sample import Sample
+from yara_rules import RULE_GROUPS, group_files, get_timeout
+
+
+class rule_Profile():
+	def __init__(self, groups=None, rules=None):
+		# each rule file on its own, the bundles can not be timed per
+		# namespace. rules, {namespace: compiled}, skips the compile
+		self.rules = rules
+		if rules is None:
+			self.rules = {}
+			for group in sorted(groups or RULE_GROUPS.keys()):
+				for namespace, path in group_files(group):
+					self.rules[namespace] = yara.compile(filepath=path)
+
+		self.stats = dict((namespace, {"scans": 0, "time": 0.0, "max": 0.0, "matches": 0, "timeouts": 0})
+			for namespace in self.rules)
+
+	def scan_profiling(self, data, timeout=60):
+		# same idea as balbuzard's scan_profiling: yields (namespace, matches)
+		# for every namespace that matched and keeps the time each one took
+		for namespace in sorted(self.rules):
+			stat = self.stats[namespace]
+			start = time.time()
+			try:
+				matches = self.rules[namespace].match(data=data, timeout=timeout)
+			except yara.Error:
+				matches = []
+				stat["timeouts"] += 1
+			elapsed = time.time() - start
+
+			stat["scans"] += 1
+			stat["time"] += elapsed
+			stat["max"] = max(stat["max"], elapsed)
+			stat["matches"] += len(matches)
+			if matches:
+				yield namespace, matches
+
+	def slow_rules(self, limit):
+		return sorted(namespace for namespace, stat in self.stats.items()
+			if stat["timeouts"] or (stat["scans"] and stat["time"] / stat["scans"] > limit))
+
+	def write_report(self, path, limit=1.0):
+		slow = set(self.slow_rules(limit))
+		with open(path, 'w') as f:
+			f.write("namespace;scans;total;average;max;matches;timeouts;slow\n")
+			for namespace, stat in sorted(self.stats.items(), key=lambda item: -item[1]["time"]):
+				average = stat["time"] / stat["scans"] if stat["scans"] else 0.0
+				f.write("%s;%d;%.6f;%.6f;%.6f;%d;%d;%s\n" % (namespace, stat["scans"], stat["time"],
+					average, stat["max"], stat["matches"], stat["timeouts"], namespace in slow))
+
+
+def list_files(names):
+	for name in names:
+		if os.path.isdir(name):
+			for root, dirs, files in os.walk(name):
+				for f in files:
+					yield os.path.join(root, f)
+		else:
+			yield name
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument("file_name", type=str, nargs='+', help="Samples or directories to profile the rules on")
+	parser.add_argument("-o", "--output", type=str, default="report/yara_profile.csv", help="Profile report file")
+	parser.add_argument("-s", "--slow", type=float, default=1.0, help="Average seconds per sample that marks a rule file slow")
+	args = parser.parse_args()
+
+	profile = rule_Profile()
+	timeout = get_timeout()
+	count = 0
+	for filepath in list_files(args.file_name):
+		with Sample(filepath) as sample:
+			for namespace, matches in profile.scan_profiling(sample.data, timeout):
+				pass
+		count += 1
+
+	profile.write_report(args.output, args.slow)
+	print "%d samples profiled, report in %s" % (count, args.output)
+	slow = profile.slow_rules(args.slow)
+	if slow:
+		print "slow rule files, to quarantine add to [yara] in config.cfg:"
+		print "quarantine = %s" % ", ".join(slow)
@@ -0,0 +1,237 @@
+import os
+import re
+import uuid
+import hashlib
+import threading
+import configparser
+import yara
+import logging
+
+logger = logging.getLogger('main')
+
+# rule groups, a .list file names the rule files next to it
+RULE_GROUPS = {
+	"clamav": "data/clamav/main.yara",
+	"malware": "data/malware/yara.list",
+	"operational": "data/Operation_Blockbuster/yara.list",
+	"antivm": "data/antivm.yara",
+	"doc": "data/filetype/doc.yara",
+	"exe": "data/filetype/exe.yara",
+	"pdf": "data/filetype/pdf.yara",
+	"jpeg": "data/filetype/jpeg.yara",
+	"mobile": "data/mobile/yara.list",
+}
+
+# every sample is matched against these groups
+COMMON_RULES = ["clamav", "malware", "operational", "antivm"]
+
+# extra groups by detected file type (lib/filetype.py names)
+TYPE_RULES = {
+	"msdos": ["doc"],
+	"msdoc": ["doc"],
+	"excel": ["doc"],
+	"rtf": ["doc"],
+	"exe": ["exe"],
+	"pdf": ["pdf"],
+	"jpeg": ["jpeg"],
+	"android": ["mobile"],
+	"jar": ["mobile"],
+	"zip": ["mobile"],
+}
+
+
+def route_groups(filetype, size, large_size):
+	# known types always get their own groups, unknown ones get every
+	# type specific group unless the file is large enough that only the
+	# common groups are worth the time
+	groups = list(COMMON_RULES)
+	if filetype == "any":
+		if size <= large_size:
+			for names in TYPE_RULES.values():
+				groups.extend(names)
+	else:
+		groups.extend(TYPE_RULES.get(filetype, []))
+	return sorted(set(groups))
+
+
+text_string = re.compile(r'\$\w*\s*=\s*"((?:[^"\\]|\\.)*)"((?:\s*(?:ascii|wide|nocase|fullword|private|xor)\b)*)')
+hex_string = re.compile(r'\$\w*\s*=\s*\{([^}]*)\}')
+regex_string = re.compile(r'\$\w*\s*=\s*/')
+hex_jump = re.compile(r'\[\s*(\d*)\s*(-?)\s*(\d*)\s*\]')
+escape = re.compile(r'\\x[0-9a-fA-F]{2}|\\.')
+
+
+def max_string_length(files, unbounded):
+	# longest string any rule can match, chunked scans overlap their
+	# windows by this much; regexes and open hex jumps have no upper
+	# bound and count as unbounded
+	longest = 0
+	for namespace, path in files:
+		with open(path) as f:
+			source = f.read()
+
+		for value, modifiers in text_string.findall(source):
+			size = len(escape.sub("x", value))
+			if "wide" in modifiers:
+				size *= 2
+			longest = max(longest, size)
+
+		for value in hex_string.findall(source):
+			size = len(re.sub(r'[^0-9a-fA-F?]', '', hex_jump.sub('', value))) / 2
+			for low, dash, high in hex_jump.findall(value):
+				if dash and not high:
+					size += unbounded
+				else:
+					size += int(high or low or 0)
+			longest = max(longest, size)
+
+		if regex_string.search(source):
+			longest = max(longest, unbounded)
+
+	return longest
+
+
+def group_files(group):
+	# (namespace, path) for every rule file of a group, list based groups
+	# get one namespace per file so equal rule names do not clash
+	path = RULE_GROUPS[group]
+	if not path.endswith(".list"):
+		return [(group, path)]
+
+	files = []
+	with open(path) as f:
+		for name in f.read().splitlines():
+			name = name.strip()
+			if name:
+				files.append(("%s/%s" % (group, name), os.path.join(os.path.dirname(path), name)))
+	return files
+
+
+file_digests = {}
+
+def file_digest(path):
+	# content hash, remembered per size/mtime so clamav's main.yara is
+	# not reread for every sample
+	st = os.stat(path)
+	key = (path, st.st_size, st.st_mtime)
+	if key not in file_digests:
+		h = hashlib.sha256()
+		with open(path, 'rb') as f:
+			for data in iter(lambda: f.read(1024 * 1024), ''):
+				h.update(data)
+		file_digests[key] = h.hexdigest()
+	return file_digests[key]
+
+
+def bundle_digest(files):
+	# a newer libyara can not load bundles saved by an older one
+	h = hashlib.sha256(getattr(yara, '__version__', ''))
+	for namespace, path in sorted(files):
+		h.update("%s:%s\n" % (namespace, file_digest(path)))
+	return h.hexdigest()
+
+
+class rule_Bundles():
+	def __init__(self, path, quarantine=()):
+		self.path = path
+		self.quarantine = set(quarantine)
+		if not os.path.isdir(path):
+			os.makedirs(path)
+		self.lock = threading.Lock()
+		self.loaded = {}
+		self.overlaps = {}
+		self.file_rules = {}
+
+	def bundle_files(self, groups):
+		files = []
+		for group in sorted(set(groups)):
+			files.extend(f for f in group_files(group) if f[0] not in self.quarantine)
+		return files
+
+	def get(self, groups):
+		# compiled rules for a set of groups, built once per distinct
+		# source content and shared by every worker through the bundle file
+		files = self.bundle_files(groups)
+		digest = bundle_digest(files)
+
+		with self.lock:
+			if digest not in self.loaded:
+				self.loaded[digest] = self.load(digest, files)
+			return digest, self.loaded[digest]
+
+	def overlap(self, groups, unbounded):
+		files = self.bundle_files(groups)
+		digest = bundle_digest(files)
+
+		with self.lock:
+			if digest not in self.overlaps:
+				self.overlaps[digest] = max_string_length(files, unbounded)
+			return self.overlaps[digest]
+
+	def split(self, groups):
+		# the rule files of a bundle compiled one by one, for timing each
+		# namespace; a file is compiled again only when its content changes
+		files = self.bundle_files(groups)
+		rules = {}
+		with self.lock:
+			for namespace, path in files:
+				key = (namespace, file_digest(path))
+				if key not in self.file_rules:
+					self.file_rules[key] = yara.compile(filepath=path)
+				rules[namespace] = self.file_rules[key]
+		return rules
+
+	def load(self, digest, files):
+		bundle = os.path.join(self.path, digest + ".yarc")
+		if os.path.isfile(bundle):
+			return yara.load(bundle)
+
+		logger.info("Compile yara bundle %s from %d rule files" % (digest, len(files)))
+		rules = yara.compile(filepaths=dict(files))
+		tmp_path = "%s.%s" % (bundle, uuid.uuid4().hex)
+		rules.save(tmp_path)
+		os.rename(tmp_path, bundle)
+		return rules
+
+
+def get_config():
+	parser = configparser.ConfigParser()
+	parser.read('config.cfg')
+	return parser
+
+
+def get_quarantine(parser):
+	value = parser.get('yara', 'quarantine', fallback='')
+	return [name.strip() for name in value.split(",") if name.strip()]
+
+
+bundles = []
+
+def get_bundles():
+	# compiled rules are read only, workers forked later share the pages
+	if not bundles:
+		parser = get_config()
+		bundles.append(rule_Bundles(parser.get('yara', 'bundles', fallback='cache/yara'),
+			get_quarantine(parser)))
+	return bundles[0]
+
+
+def get_timeout():
+	return get_config().getint('yara', 'timeout', fallback=60)
+
+
+def get_large_size():
+	return get_config().getint('yara', 'large_size', fallback=32 * 1024 * 1024)
+
+
+def get_chunk_size():
+	return get_config().getint('yara', 'chunk_size', fallback=64 * 1024 * 1024)
+
+
+def get_max_overlap():
+	return get_config().getint('yara', 'max_overlap', fallback=64 * 1024)
+
+
+if __name__ == "__main__":
+	digest, rules = get_bundles().get(RULE_GROUPS.keys())
+	print digest
@@ -0,0 +1,91 @@
+import binascii
+import yara
+import logging
+from result_cache import get_cache
+
+logger = logging.getLogger('main')
+
+CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def match_dict(match, base=0):
+	# plain data for a yara match, string offsets relative to the whole
+	# input and matched bytes in hex so the result can go to json
+	return {"rule": match.rule, "namespace": match.namespace, "tags": list(match.tags),
+		"meta": dict(match.meta),
+		"strings": [(base + offset, identifier, binascii.hexlify(data))
+			for offset, identifier, data in match.strings]}
+
+
+def merge_matches(results):
+	# a string inside the overlap is found by both windows, keep it once
+	merged = {}
+	for result in results:
+		key = (result["namespace"], result["rule"])
+		if key not in merged:
+			merged[key] = dict(result, strings=set())
+		merged[key]["strings"].update(tuple(s) for s in result["strings"])
+
+	matches = []
+	for key in sorted(merged):
+		merged[key]["strings"] = sorted(merged[key]["strings"])
+		matches.append(merged[key])
+	return matches
+
+
+def scan_windows(rules, windows, timeout):
+	# returns the matches and whether every window was scanned completely
+	results = []
+	complete = True
+	for base, data in windows:
+		try:
+			for match in rules.match(data=data, timeout=timeout):
+				results.append(match_dict(match, base))
+		except yara.Error as e:
+			logger.error("yara scan of window at %d failed : %s" % (base, e))
+			complete = False
+	return merge_matches(results), complete
+
+
+def cached_scan(sha256, bundle, groups, scan):
+	# the matches only depend on the sample and the compiled rules, a
+	# resubmission or rescan with the same bundle skips yara entirely
+	cache = get_cache()
+	matches = cache.get_matches(sha256, bundle)
+	if matches is not None:
+		return matches
+
+	matches, complete = scan()
+	if complete:
+		cache.put_matches(sha256, bundle, matches, groups)
+	return matches
+
+
+def sample_windows(sample, chunk_size, overlap):
+	# zero copy views over the mapped sample, the kernel pages them in
+	# and out so memory stays bounded whatever the file size
+	for base in xrange(0, max(sample.size, 1), chunk_size):
+		yield base, sample.view(base, min(chunk_size + overlap, sample.size - base))
+
+
+def stream_windows(f, chunk_size, overlap):
+	# sequential reads for inputs that can not be mapped, the tail of the
+	# previous window is carried over as the overlap
+	base = 0
+	tail = ''
+	while True:
+		data = f.read(chunk_size)
+		if not data:
+			break
+		window = tail + data
+		yield base - len(tail), window
+		base += len(data)
+		tail = window[-overlap:] if overlap else ''
+
+
+def scan_chunks(rules, sample, overlap, chunk_size=CHUNK_SIZE, timeout=60):
+	return scan_windows(rules, sample_windows(sample, chunk_size, overlap), timeout)
+
+
+def scan_stream(rules, f, overlap, chunk_size=CHUNK_SIZE, timeout=60):
+	return scan_windows(rules, stream_windows(f, chunk_size, overlap), timeout)
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import argparse
+import traceback
+from multiprocessing import Pool, Lock, Value, cpu_count
+from lib.sample import Sample
+from lib.pipeline import static_Pipeline, merge_status
+from lib.result_cache import get_cache, stage_fingerprints, ENGINE_VERSION
+from lib.report import report_Class
+
+STAGES = ["peframe_scan", "md5_scan", "vt_scan", "yara_scan", "xor_scan", "string_scan", "meta_scan"]
+
+# one virustotal query per sample, only rerun when asked for
+REMOTE_STAGES = ["vt_scan"]
+
+fingerprints = None
+remote = False
+limit = None
+
+
+class rate_Limit():
+	# spaces calls at least 60/per_minute seconds apart over every worker
+	# of the pool
+	def __init__(self, per_minute):
+		self.interval = 60.0 / per_minute
+		self.lock = Lock()
+		self.next_call = Value('d', 0.0, lock=False)
+
+	def wait(self):
+		with self.lock:
+			now = time.time()
+			delay = self.next_call.value - now
+			self.next_call.value = max(now, self.next_call.value) + self.interval
+		if delay > 0:
+			time.sleep(delay)
+
+
+def init_worker(current, rerun_remote, remote_limit):
+	# every worker compares against the same signature snapshot
+	global fingerprints, remote, limit
+	fingerprints = current
+	remote = rerun_remote
+	limit = remote_limit
+
+
+def list_reports(report_dir):
+	for md5 in os.listdir(report_dir):
+		if os.path.isfile(os.path.join(report_dir, md5, md5 + ".json")):
+			yield md5
+
+
+def changed_stages(entry, old_stages):
+	stages = [name for name in STAGES if remote or name not in REMOTE_STAGES]
+	if entry is None or entry['engine_version'] != ENGINE_VERSION:
+		return stages
+
+	rerun = []
+	for name in stages:
+		if entry['signatures'].get(name) != fingerprints[name]:
+			rerun.append(name)
+		elif name != "peframe_scan" and name not in old_stages:
+			# skipped by an early malware exit on the previous run
+			rerun.append(name)
+	return rerun
+
+
+def rescan_sample(md5):
+	try:
+		with open("report/%s/%s.json" % (md5, md5)) as f:
+			cfg = json.load(f)
+		filepath = "report/%s/%s" % (md5, cfg['file_name'])
+
+		with Sample(filepath) as sample:
+			sha256 = sample.sha256
+			entry = get_cache().get_entry("sha256", sha256)
+			if entry is not None:
+				old_verdict = entry['verdict']
+				old_stages = entry['stages']
+			else:
+				old_verdict = cfg.get('Result')
+				old_stages = {}
+
+			stages = dict(old_stages)
+			rerun = changed_stages(entry, old_stages)
+			pipeline = static_Pipeline(sample)
+			for name in rerun:
+				if name in REMOTE_STAGES:
+					limit.wait()
+				stages[name] = getattr(pipeline, name)()
+
+		verdict = merge_status(stages.values())
+		if rerun:
+			report_Class(filepath, verdict, md5).gen_Report()
+
+		return md5, sha256, old_verdict, verdict, stages, rerun, None
+	except Exception:
+		return md5, None, None, None, None, [], traceback.format_exc()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument("-w", "--workers", type=int, default=cpu_count(), help="Number of scan processes")
+	parser.add_argument("-d", "--diff", type=str, default="report/rescan_diff.csv", help="Verdict diff output file")
+	parser.add_argument("--vt", action="store_true", help="Rerun vt_scan too, one VirusTotal query per sample")
+	parser.add_argument("--vt-rate", type=float, default=4, help="VirusTotal queries per minute (default 4, the public API limit)")
+	args = parser.parse_args()
+
+	current = stage_fingerprints()
+	pool = Pool(args.workers, initializer=init_worker, initargs=(current, args.vt, rate_Limit(args.vt_rate)))
+	cache = get_cache()
+
+	start = time.time()
+	total = changed = failed = 0
+	with open(args.diff, 'w') as diff:
+		diff.write("md5;old;new;stages\n")
+		for md5, sha256, old, new, stages, rerun, error in pool.imap_unordered(rescan_sample, list_reports("report"), 16):
+			total += 1
+			if error:
+				failed += 1
+				print "rescan failed for %s\n%s" % (md5, error)
+				continue
+
+			if rerun:
+				cache.put(sha256, md5, new, stages, current)
+
+			if str(old) != str(new):
+				changed += 1
+				diff.write("%s;%s;%s;%s\n" % (md5, old, new, ",".join(rerun)))
+				diff.flush()
+
+			if total % 1000 == 0:
+				print "%d samples rescanned, %d changed, %.1f samples/s" % (total, changed, total / (time.time() - start))
+
+	pool.close()
+	pool.join()
+	print "Done: %d samples, %d verdict changes, %d failures, diff in %s" % (total, changed, failed, args.diff)
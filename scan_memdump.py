@@ -0,0 +1,42 @@
+import os
+import sys
+import json
+import time
+import argparse
+from lib.sample import Sample
+from lib.yara_rules import RULE_GROUPS, get_bundles, get_timeout, get_chunk_size, get_max_overlap
+from lib.yara_scan import scan_chunks, scan_stream, cached_scan
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument("dump", type=str, help="Memory dump or large file, - reads stdin")
+	parser.add_argument("-g", "--groups", type=str, default=",".join(sorted(RULE_GROUPS)), help="Comma separated rule groups")
+	parser.add_argument("-o", "--output", type=str, help="Match report, default <dump>.yara.json")
+	parser.add_argument("-c", "--chunk", type=int, default=get_chunk_size(), help="Window size in bytes")
+	parser.add_argument("-s", "--sequential", action="store_true", help="Read the input instead of mapping it")
+	args = parser.parse_args()
+
+	groups = [group.strip() for group in args.groups.split(",") if group.strip()]
+	bundles = get_bundles()
+	digest, rules = bundles.get(groups)
+	overlap = bundles.overlap(groups, get_max_overlap())
+	output = args.output or (args.dump if args.dump != "-" else "stdin") + ".yara.json"
+
+	start = time.time()
+	if args.dump == "-":
+		matches, complete = scan_stream(rules, sys.stdin, overlap, args.chunk, get_timeout())
+	elif args.sequential:
+		with open(args.dump, 'rb') as f:
+			matches, complete = scan_stream(rules, f, overlap, args.chunk, get_timeout())
+	else:
+		with Sample(args.dump) as sample:
+			matches = cached_scan(sample.sha256, digest, groups,
+				lambda: scan_chunks(rules, sample, overlap, args.chunk, get_timeout()))
+
+	with open(output, 'w') as f:
+		json.dump({"file": args.dump, "bundle": digest, "overlap": overlap, "matches": matches}, f, indent=4)
+
+	print "%d rules matched in %.1fs, report in %s" % (len(matches), time.time() - start, output)
+	for match in matches:
+		print "%s:%s %d hits" % (match["namespace"], match["rule"], len(match["strings"]))
@@ -1,87 +1,344 @@
 import socket                   # Import socket module
-import re
-import time
-import socket
-import hashlib
-import md5
-from tasks import static_analysis
-from SocketServer import ThreadingMixIn
-import time
-import subprocess
 import os
-import commands
+import uuid
+import errno
+import select
+import hashlib
+import threading
+import SocketServer
 import configparser
+from celery_client import submit, wait_result, wait_results
+from lib import protocol
+from lib.result_cache import get_cache
+from collections import OrderedDict, deque
 
 parser = configparser.ConfigParser()
 parser.read('config.cfg')
 server_ip = parser.get('config', 'server_ip')
 server_port = parser.get('config', 'server_port')
+spool_dir = parser.get('server', 'spool', fallback='spool')
+max_inflight = parser.getint('server', 'max_inflight', fallback=32)
 print "server ip %s" % server_ip
 print "server port %s" % server_port
 
+# uploads beyond max_inflight wait before their body is read, the
+# client then blocks on a full tcp window
+inflight = threading.BoundedSemaphore(max_inflight)
+
+# jobs by id for "send", oldest dropped first
+jobs = OrderedDict()
+jobs_lock = threading.Lock()
+MAX_JOBS = 10000
+
+# "rece" uploads of each client address not yet claimed by a "send"
+# without a job id, oldest first
+uploads = {}
+MAX_UPLOADS = 256
+
+# a celery task id, the text of a uuid4
+JOB_ID_SIZE = 36
+# seconds "send" waits for a job id before it takes the upload of the address
+JOB_ID_WAIT = 1.0
+
+
+def recv_exact(conn, size):
+	data = ''
+	while len(data) < size:
+		chunk = conn.recv(size - len(data))
+		if not chunk:
+			break
+		data += chunk
+	return data
+
+
+def recv_job_id(conn):
+	# "send" may be followed by the job id "rece" answered with, older
+	# clients send nothing more and wait for the verdict
+	ready, _, _ = select.select([conn], [], [], JOB_ID_WAIT)
+	if not ready:
+		return None
+	conn.settimeout(JOB_ID_WAIT)
+	try:
+		return recv_exact(conn, JOB_ID_SIZE).strip() or None
+	except socket.timeout:
+		return None
+	finally:
+		conn.settimeout(None)
+
+
+def add_job(res, md5):
+	with jobs_lock:
+		jobs[res.id] = (res, md5)
+		while len(jobs) > MAX_JOBS:
+			jobs.popitem(last=False)
+
+
+class upload_Slot():
+	# a "rece" upload, registered before the client is answered so that
+	# the "send" following it always finds it and waits for its job
+	def __init__(self):
+		self.queued = threading.Event()
+		self.job = None
+
+
+def open_upload(ip):
+	slot = upload_Slot()
+	with jobs_lock:
+		uploads.setdefault(ip, deque(maxlen=MAX_UPLOADS)).append(slot)
+	return slot
+
+
+def claim_upload(ip, job_id=None):
+	# the upload of a job id, or for clients that send no id the oldest
+	# upload of the address, clients behind one address then get them in
+	# the order they arrived
+	with jobs_lock:
+		slots = uploads.get(ip)
+		if not slots:
+			return None
+		if job_id is None:
+			slot = slots.popleft()
+		else:
+			for slot in slots:
+				if slot.job is not None and slot.job[0].id == job_id:
+					slots.remove(slot)
+					break
+			else:
+				return None
+		if not slots:
+			del uploads[ip]
+	return slot
+
+
+def spool_upload(chunks, file_name):
+	# hash while streaming to disk, the sample ends up under its sha256
+	tmp_path = os.path.join(spool_dir, "tmp-" + uuid.uuid4().hex)
+	m = hashlib.md5()
+	s256 = hashlib.sha256()
+	with open(tmp_path, 'wb') as f:
+		for data in chunks:
+			m.update(data)
+			s256.update(data)
+			f.write(data)
+
+	sample_dir = os.path.join(spool_dir, s256.hexdigest())
+	try:
+		os.makedirs(sample_dir)
+	except OSError as e:
+		if e.errno != errno.EEXIST:
+			raise
+
+	filepath = os.path.join(sample_dir, file_name)
+	os.rename(tmp_path, filepath)
+	return filepath, m.hexdigest(), s256.hexdigest()
+
+
+def queue_sample(chunks, file_name, source_type, ip):
+	inflight.acquire()
+	try:
+		filepath, md5, sha256 = spool_upload(chunks, file_name)
+	finally:
+		inflight.release()
+
+	with open(filepath + ".ip", 'w') as f:
+		f.write(ip + "\n")
+
+	res = submit(filepath, "None", source_type)
+	print "file %s md5 %s job %s" % (file_name, md5, res.id)
+	return res, md5, sha256
+
+
+def report_path(md5):
+	return "report/"+md5+"/"+md5+".json"
+
+
+class upload_Handler(SocketServer.BaseRequestHandler):
+
+	def handle(self):
+		conn = self.request
+		ip = self.client_address[0]
+		print 'Got connection from', self.client_address
+
+		d1 = recv_exact(conn, 4)
+		if d1 == protocol.MAGIC:
+			self.serve_framed(conn, ip, d1)
+		elif d1 == "rece":
+			self.receive(conn, ip)
+		elif d1 == "send":
+			self.send_report(conn, ip)
+
+	def serve_framed(self, conn, ip, magic):
+		# versioned protocol, any number of SUBMIT/WAIT frames per connection
+		try:
+			protocol.recv_hello(conn, magic)
+		except protocol.ProtocolError as e:
+			protocol.send_error(conn, e)
+			return
+		protocol.send_hello(conn)
+		protocol.tune_socket(conn)
+
+		pending = {}
+		while True:
+			try:
+				ftype, header, size = protocol.recv_frame(conn)
+			except protocol.ProtocolError:
+				break
+
+			if ftype == protocol.SUBMIT:
+				file_name = os.path.basename(header.get('name', '')) or "sample"
+				source_type = str(header.get('source_type', "None"))
+				res, md5, sha256 = queue_sample(protocol.recv_body(conn, size), file_name, source_type, ip)
+				pending[res.id] = (res, md5)
+				add_job(res, md5)
+				protocol.send_frame(conn, protocol.JOB, {"job": res.id, "name": file_name,
+					"md5": md5, "sha256": sha256})
+
+			elif ftype == protocol.WAIT:
+				protocol.skip_body(conn, size)
+				job = pending.pop(header.get('job'), None)
+				if job is None:
+					protocol.send_error(conn, "unknown job %s" % header.get('job'))
+					continue
+
+				res, md5 = job
+				output = wait_result(res)
+				print "output %s" % output
+				result = {"job": res.id, "verdict": output, "md5": md5}
+				if os.path.isfile(report_path(md5)):
+					protocol.send_file_frame(conn, protocol.RESULT, result, report_path(md5))
+				else:
+					protocol.send_frame(conn, protocol.RESULT, result)
+
+			elif ftype == protocol.QUERY:
+				protocol.skip_body(conn, size)
+				protocol.send_frame(conn, protocol.KNOWN, {"results": self.lookup(header.get('sha256', []))})
+
+			elif ftype == protocol.FETCH:
+				protocol.skip_body(conn, size)
+				self.send_known(conn, header.get('sha256'))
+
+			elif ftype == protocol.WAIT_ALL:
+				protocol.skip_body(conn, size)
+				self.send_manifest(conn, pending, header.get('jobs'), header.get('reports', True))
+
+			elif ftype == protocol.BYE:
+				break
+
+			else:
+				protocol.skip_body(conn, size)
+				protocol.send_error(conn, "unexpected frame %d" % ftype)
+
+	def lookup(self, hashes):
+		# lets a batch client skip uploading samples we already have a
+		# current verdict for
+		known = {}
+		cache = get_cache()
+		for sha256 in hashes:
+			entry = cache.get(sha256=sha256)
+			if entry is not None:
+				known[sha256] = {"md5": entry['md5'], "verdict": entry['verdict']}
+		return known
+
+	def send_known(self, conn, sha256):
+		# the report of a sample QUERY answered from the cache
+		known = self.lookup([sha256]).get(sha256)
+		if known is None:
+			protocol.send_error(conn, "unknown sample %s" % sha256)
+			return
+
+		result = {"job": None, "verdict": known['verdict'], "md5": known['md5']}
+		if os.path.isfile(report_path(known['md5'])):
+			protocol.send_file_frame(conn, protocol.RESULT, result, report_path(known['md5']))
+		else:
+			protocol.send_frame(conn, protocol.RESULT, result)
+
+	def send_manifest(self, conn, pending, job_ids, reports):
+		if job_ids is None:
+			job_ids = pending.keys()
+		results = []
+		for job_id in job_ids:
+			if job_id in pending:
+				results.append(pending[job_id][0])
+			else:
+				protocol.send_error(conn, "unknown job %s" % job_id)
+
+		def on_result(job_id, output):
+			res, md5 = pending.pop(job_id)
+			result = {"job": job_id, "verdict": output, "md5": md5}
+			if reports and os.path.isfile(report_path(md5)):
+				protocol.send_file_frame(conn, protocol.RESULT, result, report_path(md5))
+			else:
+				protocol.send_frame(conn, protocol.RESULT, result)
+
+		wait_results(results, on_result)
+		protocol.send_frame(conn, protocol.DONE, {"count": len(results)})
+
+	def receive(self, conn, ip):
+		slot = open_upload(ip)
+		try:
+			source_type = conn.recv(1024)
+			conn.send("done")
+			size1 = recv_exact(conn, 2)
+			file_name = os.path.basename(recv_exact(conn, int(size1)))
+
+			chunks = iter(lambda: conn.recv(65536), '')
+			res, md5, sha256 = queue_sample(chunks, file_name, source_type, ip)
+			add_job(res, md5)
+			slot.job = (res, md5)
+		finally:
+			# a failed upload leaves no job, its "send" gets no verdict
+			slot.queued.set()
+
+		# clients that only half-closed get their job id right away
+		try:
+			conn.sendall(res.id)
+		except socket.error:
+			pass
+
+	def send_report(self, conn, ip):
+		# by id, two clients behind one address would otherwise get each
+		# other's verdicts. without one the upload of the address is
+		# waited for, it may still be spooling when "send" arrives
+		job_id = recv_job_id(conn)
+		if job_id:
+			claim_upload(ip, job_id)
+			with jobs_lock:
+				job = jobs.get(job_id)
+		else:
+			slot = claim_upload(ip)
+			if slot is None:
+				return
+			slot.queued.wait()
+			job = slot.job
+		if job is None:
+			return
+
+		res, md5 = job
+		output = wait_result(res)
+		print "output %s" % output
+		conn.send(output)
+
+		fpath = report_path(md5)
+		if os.path.isfile(fpath):
+			with open(fpath, 'rb') as f:
+				l = f.read(65536)
+				while (l):
+					conn.sendall(l)
+					l = f.read(65536)
+
+		print('Done sending')
+
+
+class upload_Server(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+	request_queue_size = 128
+
 
-port = int(server_port)               # Reserve a port for your service.
-s = socket.socket()             # Create a socket object
-host = str(server_ip)     # Get local machine name
-s.bind((host, port))            # Bind to the port
-s.listen(5)                     # Now wait for client connection.
-
-print 'Server listening....'
-
-while True:
-    conn, addr = s.accept()     # Establish connection with client.
-    print 'Got connection from', addr 
-    
-    d1 = conn.recv(4)
-    print d1
-	
-    if d1 == "rece":
-	source_type = conn.recv(1024)
-	conn.send("done")
-	size1 = conn.recv(2)
-	file_name = conn.recv(int(size1))
-	print file_name
-    	with open("/tmp/"+file_name, 'wb') as f:
-        	print 'file opened'
-        	while True:
-            		print('receiving data...')
-            		data = conn.recv(1024)
-            		print('data=%s', (data))
-            		if not data:
-				print "k"
-                		break
-            		# write data to a file
-            		f.write(data)
-    	f.close()
-
-    ip1 = re.findall( r'[0-9]+(?:\.[0-9]+){3}', str(addr))
-    for ip in ip1:
-    	os.system("echo %s > /tmp/%s.ip" % (ip, file_name))
-
-    md5 = hashlib.md5(open("/tmp/"+file_name).read()).hexdigest()
-    print md5
-    command = "python celery_client.py /tmp/%s None %s" % (file_name, source_type)
-    status, output = commands.getstatusoutput(command)
-    print "output %s" %output
-
-    #time.sleep(60)
-
-    conn.send(output)
-
-
-    if d1 == "send":
-	fpath = "report/"+md5+"/"+md5+".json"
-    	f = open(fpath,'rb')
-    	l = f.read(1024)
-    	while (l):
-       		conn.send(l)
-       		print('Sent ',repr(l))
-       		l = f.read(1024)
-    	f.close()
-
-    print('Done sending') 
-    conn.close()
-
-    if output != "3":
-    	os.system("python vol_malware.py %s %s" % (source_type, md5)) 
+if __name__ == "__main__":
+	if not os.path.isdir(spool_dir):
+		os.makedirs(spool_dir)
 
+	server = upload_Server((str(server_ip), int(server_port)), upload_Handler)
+	print 'Server listening....'
+	server.serve_forever()
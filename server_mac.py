@@ -3,7 +3,7 @@ import time
 import socket
 import hashlib
 import md5
-from tasks import static_analysis
+from celery_client import submit, wait_result
 from SocketServer import ThreadingMixIn
 import time
 import subprocess
@@ -36,8 +36,7 @@ while True:
     mac = conn.recv(100)
     print "recevive mac %s " % mac	
 
-    command = "python celery_client.py None %s XP" % mac
-    status, output = commands.getstatusoutput(command)
+    output = wait_result(submit("None", mac, "XP"))
     print "output %s" %output
 
     conn.send(output)
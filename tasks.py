@@ -2,16 +2,15 @@ import time
 import json
 import os
 import md5
-from celery import Celery
+from celery import Celery, chain, chord, group
+from celery.signals import worker_init
+from kombu import Queue
 from lib.startup_verify_mac import Startup_Scann
-from lib.vt_client import vt_Class
-from lib.startup import startup_report
 from lib.report import report_Class
-from lib.filetype import Scan_filetype
-from lib.meta_scan import meta_Scan
-from lib.string_client import string_Scan
-from lib.xor import xor_Scan
-from lib.startup_verify_yara import Startup_Sig 
+from lib.sample import Sample
+from lib.pipeline import static_Pipeline, merge_status
+from lib.result_cache import get_cache
+from lib.registry import preload
 from lib.genarate_report import Gen_Report_Html
 from lib.startVM import virtualboxLib
 import hashlib
@@ -22,167 +21,195 @@ import configparser
 
 logger = logging.getLogger('main')
 
+parser = configparser.ConfigParser()
+parser.read('config.cfg')
+backend = parser.get('celery', 'backend', fallback='amqp')
+use_canvas = parser.getboolean('celery', 'canvas', fallback=True)
 
-app = Celery('tasks', backend='amqp', broker='amqp://')
+app = Celery('tasks', backend=backend, broker='amqp://')
 
+# static-cpu:       file parsing and signature stages
+# network-lookup:   stages waiting on remote services
+# vm-detonation:    virtualbox runs, one per free machine
+# memory-forensics: volatility over the dumped vm memory
 app.conf.update(
-        CELERY_RESULT_BACKEND = "amqp",
+        CELERY_RESULT_BACKEND = backend,
         CELERY_RESULT_SERIALIZER='json',
+        CELERY_DEFAULT_QUEUE = 'static-cpu',
+        CELERY_QUEUES = (
+                Queue('static-cpu'),
+                Queue('network-lookup'),
+                Queue('vm-detonation'),
+                Queue('memory-forensics'),
+        ),
+        CELERY_ROUTES = {
+                'tasks.vt_scan': {'queue': 'network-lookup'},
+                'tasks.vm_detonation': {'queue': 'vm-detonation'},
+                'tasks.memory_forensics': {'queue': 'memory-forensics'},
+        },
+        # vm and volatility tasks run for minutes, do not let a worker
+        # hoard them while its siblings are idle
+        CELERYD_PREFETCH_MULTIPLIER = 1,
         )
 
 
+@worker_init.connect
+def preload_signatures(**kwargs):
+	# compile every signature source in the parent, the prefork pool
+	# children then share its pages instead of loading their own copy
+	try:
+		preload()
+	except Exception as e:
+		logger.error("Signature preload failed, workers load on demand : %s" % e)
 
-@app.task
-def static_analysis(filepath="None", md5="None", source_type="None"):
-    dlist = False 
-    check = True
-    
-    if md5 != "None":
-    	logger.info("Perform MD5 Scanning for file : %s" % md5)
-    	file_path = "report/" + md5 + "/" + md5 + ".json"
-
-    	for dirname in os.listdir('report'):
-		if md5 == dirname:
-			dlist = True
-    			logger.info("File Already Scanned file path : %s" % file_path)
-
-    	if dlist:
-		with open('report/'+md5+"/"+md5+".json") as config_data:
-        		cfg = json.load(config_data)
-			status = cfg['Result']
-    			logger.info("File Already Scanned MD5 %s status : %s" % (md5, status))
-	else:
-    		logger.info("Start MD5 Analysis on MD5 : %s" % md5)
-    		get_value = Startup_Scann(md5)
-    		status = get_value.find_mac()
-
-    	logger.info("Final MD5 %s Analysis status : %s" % (md5, status))
+
+def run_stage(filepath, stage):
+	# every stage task maps the sample itself, the mmap can not travel
+	# through the broker; filepath has to be visible to all workers
+	with Sample(filepath) as sample:
+		status = getattr(static_Pipeline(sample), stage)()
+	logger.info("%s on file %s status : %s" % (stage, filepath, status))
 	return status
-		
 
-    if filepath != "None":
 
-    	logger.info("Perform MD5 Scanning for file : %s" % filepath)
-    	md5 = hashlib.md5(open(filepath).read()).hexdigest()
+@app.task
+def peframe_report(filepath):
+	return run_stage(filepath, 'peframe_scan')
 
-    	ftype = Scan_filetype(filepath, md5)
-    	filetype = ftype.get_filetype()
+@app.task
+def md5_scan(filepath):
+	return run_stage(filepath, 'md5_scan')
 
-    	logger.info("Get File Type : %s" % filetype)
+@app.task
+def vt_scan(filepath):
+	return run_stage(filepath, 'vt_scan')
 
+@app.task
+def yara_scan(filepath):
+	return run_stage(filepath, 'yara_scan')
 
-    	head, tail = os.path.split(filepath)
+@app.task
+def xor_scan(filepath):
+	return run_stage(filepath, 'xor_scan')
 
-    	logger.info("Get File's %s MD5 : %s" % (tail, md5))
+@app.task
+def string_scan(filepath):
+	return run_stage(filepath, 'string_scan')
 
-    	file_path = "report/" + md5 + "/" + tail
+@app.task
+def meta_scan(filepath):
+	return run_stage(filepath, 'meta_scan')
 
-    	for dirname in os.listdir('report'):
-		if md5 == dirname:
-			dlist = True
-    			logger.info("File Already Scanned file path : %s" % file_path)
 
-    	if dlist:
-		with open('report/'+md5+"/"+md5+".json") as config_data:
-        		cfg = json.load(config_data)
-			status = cfg['Result']
-    			logger.info("File Already Scanned file %s status : %s" % (tail, status))
-			return status
-    
-    	else:
-
-		final_status = []
-    		logger.info("File Analysis Started : %s" % tail)
-
-    		os.system("mkdir report/"+md5)
-    		os.system("cp "+ filepath + "  report/"+md5+"/")
-		os.system("mv /tmp/%s.ip report/%s/ip.txt" % (tail, md5)) 
-
-    		logger.info("Generate Report for file : %s" % tail)
-    		report = startup_report(file_path, md5)
-    		report.peframe_scan()
-
-    		logger.info("Start MD5 Analysis on file : %s" % tail)
-    		get_value = Startup_Scann(md5)
-    		status = get_value.find_mac()
-
-    		logger.info("MD5 Analysis status : %s" % status)
-		final_status.append(status)
-		if status == "3":
-			check = False	
-
-		if check:
-			res = vt_Class(filepath, md5)
-			status = res.vt_Score()
-    			logger.info("Virus Total Scanning Analysis status : %s" % status)
-			final_status.append(status)
-			if status == "3":
-				check = False	
-
-    		if check:
-    			yara_check = Startup_Sig(filepath, filetype)
-    			status = yara_check.final_scan()
-    			logger.info("Yara Scanning Analysis status : %s" % status)
-			final_status.append(status)
-			if status == "3":
-				check = False	
-
-		if check:
-			res = xor_Scan(filepath, md5)
-			status = res.final_results()
-    			logger.info("XOR Scanning Analysis status : %s" % status)
-			final_status.append(status)
-			if status == "3":
-				check = False	
-
-		if check:
-			res = string_Scan(filepath, md5)
-			status = res.all_scan()
-    			#logger.info("String Scanning Analysis status : %s" % status)
-			final_status.append(status)
-			if status == "3":
-				check = False	
-
-		if check:
-			res = meta_Scan(filepath, md5)
-			status = res.gen_array()
-    			#logger.info("Meta Data Scanning Analysis status : %s" % status)
-			final_status.append(status)
-			if status == "3":
-				check = False	
-
-		for status in final_status:
-			if status == 3:
-				status = 3
-				check = False
-			if check:
-				if status == 2:
-					status = 2
-					check = False
-			if check:
-				if status == 1:
-					status = 1
-
-
-		
-    		logger.info("Generate Final Report for file : %s with status %s" % (tail, status))
-    		gen_report = report_Class(file_path, status, md5)
-    		gen_report.gen_Report()
-
-		file_path = "report/%s/" % md5
-	
-		if status != "3":
-			res = virtualboxLib()
-        		res.start_process(source_type, tail, filetype, file_path)
-
-		parser = configparser.ConfigParser()
-		parser.read('config.cfg')
-		server_ip = parser.get('config', 'server_ip')
-		server_port = parser.get('config', 'server_port')
-
-		Gen_Report_Html(md5, server_ip, status)
-
-    		logger.info("Final File %s Analysis status : %s" % (tail, status))
+@app.task
+def vm_detonation(source_type, file_name, filetype, file_path):
+	res = virtualboxLib()
+	res.start_process(source_type, file_name, filetype, file_path)
+
+@app.task
+def memory_forensics(source_type, md5):
+	os.system("python vol_malware.py %s %s" % (source_type, md5))
+	# the dump can be several GB, scanned in windows instead of loaded
+	os.system("python scan_memdump.py report/%s/mem.dmp -o report/%s/mem_yara.json" % (md5, md5))
+
+
+def finish_analysis(status, stages, filepath, md5, sha256, filetype, source_type):
+	head, tail = os.path.split(filepath)
+
+	logger.info("Generate Final Report for file : %s with status %s" % (tail, status))
+	gen_report = report_Class("report/" + md5 + "/" + tail, status, md5)
+	gen_report.gen_Report()
+
+	server_ip = parser.get('config', 'server_ip')
+	Gen_Report_Html(md5, server_ip, status)
+
+	get_cache().put(sha256, md5, status, stages)
+
+	# detonation is handed to its own queues, the verdict goes back
+	# to the submitter without waiting for the vm
+	if status != "3":
+		chain(vm_detonation.si(source_type, tail, filetype, "report/%s/" % md5),
+			memory_forensics.si(source_type, md5)).delay()
+
+	logger.info("Final File %s Analysis status : %s" % (tail, status))
+	return status
+
+STAGE_TASKS = [
+	("peframe_scan", peframe_report),
+	("md5_scan", md5_scan),
+	("vt_scan", vt_scan),
+	("yara_scan", yara_scan),
+	("xor_scan", xor_scan),
+	("string_scan", string_scan),
+	("meta_scan", meta_scan),
+]
+
+@app.task
+def merge_stages(results, filepath, md5, sha256, filetype, source_type):
+	stages = dict(zip([name for name, task in STAGE_TASKS], results))
+	return finish_analysis(merge_status(results), stages, filepath, md5, sha256, filetype, source_type)
+
+
+def analysis_canvas(filepath, md5, sha256, filetype, source_type):
+	stages = group(task.si(filepath) for name, task in STAGE_TASKS)
+	return chord(stages, merge_stages.s(filepath, md5, sha256, filetype, source_type))
+
+
+@app.task(bind=True)
+def static_analysis(self, filepath="None", md5="None", source_type="None"):
+	cache = get_cache()
+
+	if md5 != "None":
+		logger.info("Perform MD5 Scanning for file : %s" % md5)
+		file_path = "report/" + md5 + "/" + md5 + ".json"
+
+		entry = cache.get(md5=md5)
+		if entry:
+			status = entry['verdict']
+			logger.info("File Already Scanned MD5 %s status : %s" % (md5, status))
+		elif os.path.isfile(file_path):
+			# reports written before the result cache existed
+			with open(file_path) as config_data:
+				cfg = json.load(config_data)
+				status = cfg['Result']
+			logger.info("File Already Scanned file path : %s status : %s" % (file_path, status))
+		else:
+			logger.info("Start MD5 Analysis on MD5 : %s" % md5)
+			get_value = Startup_Scann(md5)
+			status = get_value.find_mac()
+
+		logger.info("Final MD5 %s Analysis status : %s" % (md5, status))
 		return status
 
+	if filepath != "None":
+		logger.info("Perform MD5 Scanning for file : %s" % filepath)
+		sample = Sample(filepath)
+		md5 = sample.md5
+		sha256 = sample.sha256
+		head, tail = os.path.split(filepath)
+		logger.info("Get File's %s MD5 : %s" % (tail, md5))
+
+		entry = cache.get(sha256=sha256)
+		if entry:
+			status = entry['verdict']
+			logger.info("File Already Scanned file %s status : %s" % (tail, status))
+			sample.close()
+			return status
+
+		filetype = sample.filetype
+		logger.info("Get File Type : %s" % filetype)
+		logger.info("File Analysis Started : %s" % tail)
+
+		os.system("mkdir -p report/"+md5)
+		os.system("cp "+ filepath + "  report/"+md5+"/")
+		os.system("mv %s.ip report/%s/ip.txt" % (filepath, md5)) 
+
+		if use_canvas:
+			sample.close()
+			raise self.replace(analysis_canvas(filepath, md5, sha256, filetype, source_type))
+
+		pipeline = static_Pipeline(sample)
+		status = pipeline.run()
+		sample.close()
 
+		return finish_analysis(status, pipeline.results, filepath, md5, sha256, filetype, source_type)
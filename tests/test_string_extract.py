@@ -0,0 +1,65 @@
+import os
+import sys
+import random
+import unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+from string_extract import iter_strings, iter_file_strings
+
+CHUNK = 4096
+
+
+def wide(text):
+	return text.encode("utf-16le")
+
+
+class string_Extract_Test(unittest.TestCase):
+	def chunked(self, data, chunk_size=CHUNK, **kwargs):
+		return list(iter_file_strings(StringIO(data), chunk_size=chunk_size, **kwargs))
+
+	def test_wide_across_boundary(self):
+		for offset in range(CHUNK - 40, CHUNK + 4):
+			data = "\x01" * offset + wide("KernelDllLoader32") + "\x02\x03" * 20
+			self.assertEqual(self.chunked(data), list(iter_strings(data)), "offset %d" % offset)
+			self.assertIn((offset, "utf-16le", "KernelDllLoader32"), self.chunked(data))
+
+	def test_ascii_across_boundary(self):
+		for offset in range(CHUNK - 20, CHUNK + 4):
+			data = "\xff" * offset + "GetProcAddress\x00" + "\xfe" * 30
+			self.assertEqual(self.chunked(data), [(offset, "ascii", "GetProcAddress")])
+
+	def test_ascii_before_wide(self):
+		# the ascii run does not take the first character of the wide one
+		data = "\x01abcd" + wide("Kernel") + "\x01"
+		self.assertEqual(list(iter_strings(data)), [(1, "ascii", "abcd"), (5, "utf-16le", "Kernel")])
+
+	def test_single_encoding(self):
+		data = "\x01" + wide("Kernel32") + "\x01LoadLibrary\x01"
+		self.assertEqual(list(iter_strings(data, encodings=("utf-16le",))), [(1, "utf-16le", "Kernel32")])
+		self.assertEqual(list(iter_strings(data, encodings=("ascii",))), [(18, "ascii", "LoadLibrary")])
+
+	def test_random_files(self):
+		random.seed(18)
+		words = ["kernel32.dll", "LoadLibraryA", "http://example.com/a", "abc", "Zz", "cmd.exe /c"]
+		for i in range(200):
+			parts = []
+			while sum(len(part) for part in parts) < 3 * 256:
+				word = random.choice(words)
+				choice = random.randint(0, 3)
+				if choice == 0:
+					parts.append(word)
+				elif choice == 1:
+					parts.append(wide(word))
+				elif choice == 2:
+					parts.append(wide(word)[:-1])
+				else:
+					parts.append(''.join(chr(random.randint(0, 255)) for j in range(random.randint(1, 8))))
+			data = ''.join(parts)
+			for min_length in (3, 4, 6):
+				self.assertEqual(self.chunked(data, 256, min_length=min_length),
+					list(iter_strings(data, min_length)), "file %d min_length %d" % (i, min_length))
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -1,6 +1,6 @@
 #! /usr/bin/env python2
 """
-bbcrack - v0.12 2014-01-28 Philippe Lagadec
+bbcrack - v0.14 2026-10-17 Philippe Lagadec
 
 bbcrack is a tool to crack malware obfuscation such as XOR, ROL, ADD (and
 many combinations), by bruteforcing all possible keys and and checking for
@@ -37,7 +37,7 @@ For more info and updates: http://www.decalage.info/balbuzard
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
-__version__ = '0.12'
+__version__ = '0.14'
 
 #------------------------------------------------------------------------------
 # CHANGELOG:
@@ -61,6 +61,12 @@ __version__ = '0.12'
 # 2014-01-20 v0.10 PL: - added Transform_ROL, added patterns for stage 1
 # 2014-01-23 v0.11 PL: - moved and merged patterns into patterns.py
 # 2014-01-28 v0.12 PL: - ignore transforms with null scores at the end of stage 2
+# 2026-10-17 v0.13   : - stage 1 scores character transforms through inverse
+#                        tables, byte histograms and bigram counts instead of
+#                        transforming the data, in parallel processes
+#                      - numpy versions of the stateful transforms
+# 2026-10-17 v0.14   : - bounded top-K heaps for stages 1 and 2, -b option for
+#                        a time budget
 
 
 #------------------------------------------------------------------------------
@@ -104,7 +110,7 @@ __version__ = '0.12'
 
 #--- IMPORTS ------------------------------------------------------------------
 
-import sys, os, time, optparse, zipfile
+import sys, os, re, time, optparse, zipfile, multiprocessing, array, heapq
 
 # for sorting: see http://wiki.python.org/moin/HowTo/Sorting/
 from operator import itemgetter, attrgetter
@@ -112,6 +118,13 @@ from operator import itemgetter, attrgetter
 import balbuzard
 from balbuzard import Pattern, Pattern_re, bbcrack_patterns, bbcrack_patterns_stage1
 
+# numpy is optional, it is only used to speed up stateful transforms and to
+# compute the bigram counts of stage 1:
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 #--- CLASSES ------------------------------------------------------------------
 
@@ -258,6 +271,13 @@ class Transform_XOR (Transform_char):
         # here params is an integer
         return chr(ord(char) ^ self.params)
 
+    def xor_split (self):
+        """
+        Return (base, key): this transform is the base transform (None for the
+        data itself) followed by a XOR with key.
+        """
+        return None, self.params
+
     @staticmethod
     def iter_params ():
         # the XOR key can be 1 to 255 (0 would be identity)
@@ -283,6 +303,10 @@ class Transform_XOR_INC (Transform_string):
 
     def transform_string (self, data):
         # here params is an integer
+        if numpy is not None and data:
+            buf = numpy.frombuffer(data, dtype=numpy.uint8)
+            xor_key = (numpy.arange(len(data)) + self.params).astype(numpy.uint8)
+            return (buf ^ xor_key).tostring()
         #TODO: use a list comprehension + join to get better performance
         # this loop is more readable, but likely to  be much slower
         out = ''
@@ -316,6 +340,10 @@ class Transform_XOR_DEC (Transform_string):
 
     def transform_string (self, data):
         # here params is an integer
+        if numpy is not None and data:
+            buf = numpy.frombuffer(data, dtype=numpy.uint8)
+            xor_key = ((self.params + 0xFF - numpy.arange(len(data))) & 0xFF).astype(numpy.uint8)
+            return (buf ^ xor_key).tostring()
         #TODO: use a list comprehension + join to get better performance
         # this loop is more readable, but likely to  be much slower
         out = ''
@@ -355,6 +383,11 @@ class Transform_XOR_INC_ROL (Transform_string):
         #TODO: use a list comprehension + join to get better performance
         # this loop is more readable, but likely to  be much slower
         xor_key_init, rol_bits = self.params
+        if numpy is not None and data:
+            buf = numpy.frombuffer(data, dtype=numpy.uint8)
+            xor_key = (numpy.arange(len(data)) + xor_key_init).astype(numpy.uint8)
+            rol_table = numpy.array([rol(i, rol_bits) for i in xrange(256)], dtype=numpy.uint8)
+            return rol_table[buf ^ xor_key].tostring()
         out = ''
         for i in xrange(len(data)):
             xor_key = (xor_key_init + i) & 0xFF
@@ -391,6 +424,11 @@ class Transform_SUB_INC (Transform_string):
         # here params is an integer
         #TODO: use a list comprehension + join to get better performance
         # this loop is more readable, but likely to  be much slower
+        if numpy is not None and data:
+            buf = numpy.frombuffer(data, dtype=numpy.uint8)
+            key = (numpy.arange(len(data)) + self.params).astype(numpy.uint8)
+            # uint8 arithmetic wraps around like & 0xFF
+            return (buf - key).tostring()
         out = ''
         for i in xrange(len(data)):
             key = (self.params + i) & 0xFF
@@ -431,19 +469,36 @@ class Transform_XOR_Chained (Transform_string):
         self.name = "XOR %02X Chained" % params
         self.shortname = "xor%02X_chained" % params
 
+    @staticmethod
+    def base_string (data):
+        """
+        Chain data with the previous character, without key. All keys are
+        then a simple XOR of this string, see transform_char.
+        """
+        if len(data) == 0: return ''
+        if numpy is not None:
+            buf = numpy.frombuffer(data, dtype=numpy.uint8)
+            base = buf.copy()
+            base[1:] ^= buf[:-1]
+            return base.tostring()
+        l = map(ord, data)
+        # 1st char is kept as is:
+        return chr(l[0]) + ''.join(map(chr, [l[i] ^ l[i-1] for i in xrange(1, len(l))]))
+
+    def transform_char (self, char):
+        # here params is an integer, applied on base_string
+        return chr(ord(char) ^ self.params)
+
+    def xor_split (self):
+        """
+        Return (base, key): this transform is the base transform (None for
+        base_string) followed by a XOR with key.
+        """
+        return None, self.params
+
     def transform_string (self, data):
         # here params is an integer
-        #TODO: it would be much faster to do the xor_chained once, then all
-        #      xor transforms using translate() only
-        #TODO: use a list comprehension + join to get better performance
-        # this loop is more readable, but likely to  be much slower
-        if len(data) == 0: return ''
-        xor_key = self.params
-        # 1st char is just xored with key:
-        out = chr(ord(data[0]) ^ xor_key)
-        for i in xrange(1, len(data)):
-            out += chr(ord(data[i]) ^ xor_key ^ ord(data[i-1]))
-        return out
+        return self.base_string(data).translate(char_table(self))
 
     @staticmethod
     def iter_params ():
@@ -469,21 +524,36 @@ class Transform_XOR_RChained (Transform_string):
         self.name = "XOR %02X RChained" % params
         self.shortname = "xor%02X_rchained" % params
 
+    @staticmethod
+    def base_string (data):
+        """
+        Chain data with the next character, without key. All keys are then a
+        simple XOR of this string, see transform_char.
+        """
+        if len(data) == 0: return ''
+        if numpy is not None:
+            buf = numpy.frombuffer(data, dtype=numpy.uint8)
+            base = buf.copy()
+            base[:-1] ^= buf[1:]
+            return base.tostring()
+        l = map(ord, data)
+        # last char is kept as is:
+        return ''.join(map(chr, [l[i] ^ l[i+1] for i in xrange(len(l)-1)])) + chr(l[-1])
+
+    def transform_char (self, char):
+        # here params is an integer, applied on base_string
+        return chr(ord(char) ^ self.params)
+
+    def xor_split (self):
+        """
+        Return (base, key): this transform is the base transform (None for
+        base_string) followed by a XOR with key.
+        """
+        return None, self.params
+
     def transform_string (self, data):
         # here params is an integer
-        #TODO: it would be much faster to do the xor_rchained once, then all
-        #      xor transforms using translate() only
-        #TODO: use a list comprehension + join to get better performance
-        # this loop is more readable, but likely to  be much slower
-        if len(data) == 0: return ''
-        out = ''
-        xor_key = self.params
-        # all chars except last one are xored with key and next char:
-        for i in xrange(len(data)-1):
-            out += chr(ord(data[i]) ^ xor_key ^ ord(data[i+1]))
-        # last char is just xored with key:
-        out += chr(ord(data[len(data)-1]) ^ xor_key)
-        return out
+        return self.base_string(data).translate(char_table(self))
 
     @staticmethod
     def iter_params ():
@@ -520,6 +590,17 @@ class Transform_XOR_RChainedAll (Transform_string):
         # this loop is more readable, but likely to  be much slower
         if len(data) == 0: return ''
         xor_key = self.params
+        if numpy is not None:
+            # the key cancels out on every other char: from the end, chars
+            # are the xor of all following chars, with the key on the last
+            # one and then every 2nd one; the 1st char is never changed
+            buf = numpy.frombuffer(data, dtype=numpy.uint8)
+            out = buf.copy()
+            if len(data) > 2:
+                out[1:-1] = numpy.bitwise_xor.accumulate(buf[::-1])[::-1][1:-1]
+                out[len(data)-2:0:-2] ^= xor_key
+            out[-1] ^= xor_key
+            return out.tostring()
         # transform data string to list of integers:
         l = map(ord, data)
         # loop from last char to 2nd one:
@@ -728,6 +809,14 @@ class Transform_ADD_XOR (Transform_char):
         add_key, xor_key = self.params
         return chr(((ord(char) + add_key) & 0xFF) ^ xor_key)
 
+    def xor_split (self):
+        """
+        Return (base, key): this transform is the base transform (None for the
+        data itself) followed by a XOR with key.
+        """
+        add_key, xor_key = self.params
+        return Transform_ADD(add_key), xor_key
+
     @staticmethod
     def iter_params ():
         "return (ADD key1, XOR key2)"
@@ -881,6 +970,393 @@ def load_plugins ():
         execfile(f)
 
 
+def char_table (transform):
+    """
+    Return the translation table of a transform acting on each character,
+    as a string of 256 chars for str.translate.
+    """
+    return ''.join(transform.transform_char(chr(i)) for i in xrange(256))
+
+
+#--- STAGE 1 ENGINE -----------------------------------------------------------
+
+def preimage (char, nocase, inverse):
+    """
+    Return the list of bytes (as int) of the original data which become char
+    after a transform with the given inverse table (and after lower() when
+    nocase is True).
+    """
+    chars = [char]
+    if nocase and char.upper() != char:
+        chars.append(char.upper())
+    return [inverse[ord(c)] for c in chars]
+
+
+# translation tables for XOR with each key, and to set the case bit:
+XOR_TABLES = [''.join(chr(i ^ key) for i in xrange(256)) for key in xrange(256)]
+CASE_TABLE = ''.join(chr(i | 0x20) for i in xrange(256))
+NOT_NULL = re.compile(r'[^\x00]')
+
+def xor_delta (data):
+    """
+    Return the string of data[i] ^ data[i+1], which is the same for data
+    XORed with any key.
+    """
+    size = len(data) - 1
+    if size <= 0:
+        return ''
+    if numpy is not None:
+        buf = numpy.frombuffer(data, dtype=numpy.uint8)
+        return (buf[:-1] ^ buf[1:]).tostring()
+    # without numpy, a single XOR of both strings as long integers:
+    head = int(data[:-1].encode('hex'), 16)
+    tail = int(data[1:].encode('hex'), 16)
+    return ('%0*x' % (size * 2, head ^ tail)).decode('hex')
+
+
+def bigram_set (data):
+    """
+    Return the set of all pairs of consecutive bytes in data, as integers
+    (first byte << 8 | second byte).
+    """
+    bigrams = set()
+    # read the pairs at even then odd offsets as big-endian 16 bits words:
+    for start in (0, 1):
+        size = (len(data) - start) & ~1
+        words = array.array('H', data[start:start+size])
+        if sys.byteorder == 'little':
+            words.byteswap()
+        bigrams.update(words)
+    return bigrams
+
+
+class Stage1_Scorer (object):
+    """
+    Computes stage 1 scores for many transforms of the same data.
+    - Transforms ending with a XOR (see xor_split) are scored for all 256
+      keys at once, by searching the XOR delta of each pattern string in the
+      XOR delta of the data.
+    - Other transforms acting on each character (and the chained ones, which
+      are a character transform of a base string) are not applied either:
+      each pattern is mapped back to the original bytes with the inverse
+      translation table, single chars are read from the byte histogram and
+      longer strings are only counted when their first two bytes appear in
+      the data.
+    - Other transforms are applied and counted as before.
+    """
+
+    def __init__(self, data, patterns):
+        self.data = data
+        self.bbz = balbuzard.Balbuzard(patterns)
+        # inverse tables only work with simple string patterns:
+        self.literal = True
+        for pattern in patterns:
+            if type(pattern) is not Pattern or pattern.single:
+                self.literal = False
+        # (data, byte histogram, set of bigrams) for each base string:
+        self.stats = {}
+        # scores of all XOR keys for each base, see xor_scores:
+        self.xor_results = {}
+
+    def prepare (self, transform_classes):
+        """
+        Compute the base strings and their counts before forking workers,
+        so that all processes share them.
+        """
+        for Transform_class in transform_classes:
+            if self.table_based(Transform_class):
+                self.byte_stats(Transform_class)
+            if self.literal and hasattr(Transform_class, 'xor_split'):
+                # all keys of the first base are scored at once:
+                for params in Transform_class.iter_params():
+                    self.score(Transform_class(params))
+                    break
+
+    def table_based (self, Transform_class):
+        return self.literal and (issubclass(Transform_class, Transform_char)
+            or hasattr(Transform_class, 'base_string'))
+
+    def byte_stats (self, Transform_class):
+        if hasattr(Transform_class, 'base_string'):
+            key = Transform_class
+        else:
+            key = None
+        if key not in self.stats:
+            if key is None:
+                data = self.data
+            else:
+                data = Transform_class.base_string(self.data)
+            if numpy is not None and data:
+                buf = numpy.frombuffer(data, dtype=numpy.uint8)
+                hist = numpy.bincount(buf, minlength=256).tolist()
+                pairs = (buf[:-1].astype(numpy.uint16) << 8) | buf[1:]
+                bigrams = set(numpy.flatnonzero(numpy.bincount(pairs,
+                    minlength=65536)).tolist())
+            else:
+                hist = [data.count(chr(i)) for i in xrange(256)]
+                bigrams = bigram_set(data)
+            self.stats[key] = (data, hist, bigrams)
+        return self.stats[key]
+
+    def score (self, transform):
+        """
+        Return the stage 1 score of transform, same value as counting the
+        patterns on transform.transform_string(data).
+        """
+        if self.literal and hasattr(transform, 'xor_split'):
+            base, key = transform.xor_split()
+            return self.xor_scores(type(transform), base)[key]
+        if self.table_based(type(transform)):
+            stats = self.byte_stats(type(transform))
+            table = char_table(transform)
+            if len(set(table)) == 256:
+                return self.score_table(table, stats)
+            # not reversible, translate the data:
+            return self.score_data(stats[0].translate(table))
+        return self.score_data(transform.transform_string(self.data))
+
+    def xor_scores (self, Transform_class, base):
+        """
+        Return the list of scores of the XOR with each key 0-255 after base,
+        with one pass over the data for each pattern string instead of one
+        for each key.
+        """
+        if base is None:
+            name = None
+        else:
+            name = base.shortname
+        if (Transform_class, name) not in self.xor_results:
+            data, hist, bigrams = self.byte_stats(Transform_class)
+            if base is not None:
+                table = char_table(base)
+                data = data.translate(table)
+                # histogram of the base data, from the one of the data:
+                base_hist = [0] * 256
+                for i in xrange(256):
+                    base_hist[ord(table[i])] += hist[i]
+                hist = base_hist
+            # keep the scores of the last bases only, chunks of parameters
+            # follow each other:
+            if len(self.xor_results) > 16:
+                self.xor_results.clear()
+            self.xor_results[Transform_class, name] = self.score_xor(data, hist)
+        return self.xor_results[Transform_class, name]
+
+    def score_xor (self, data, hist):
+        deltas = {}
+        scores = [0] * 256
+        for pattern in self.bbz.patterns:
+            if pattern.nocase:
+                strings = pattern.pat_lower
+            else:
+                strings = pattern.pat
+            counts = [0] * 256
+            for s in strings:
+                if len(s) == 1:
+                    if pattern.nocase:
+                        chars = set([s, s.upper()])
+                    else:
+                        chars = [s]
+                    for c in chars:
+                        for key in xrange(256):
+                            counts[key] += hist[ord(c) ^ key]
+                    continue
+                if pattern.nocase not in deltas:
+                    if pattern.nocase:
+                        data_m = data.translate(CASE_TABLE)
+                    else:
+                        data_m = data
+                    deltas[pattern.nocase] = (data_m, xor_delta(data_m))
+                data_m, delta = deltas[pattern.nocase]
+                self.count_xor(s, pattern.nocase, data, data_m, delta, counts)
+            for key in xrange(256):
+                scores[key] += counts[key]*pattern.weight
+        return scores
+
+    def count_xor (self, s, nocase, data, data_m, delta, counts):
+        """
+        Add to counts[key] the number of (non overlapping) occurences of s in
+        data XORed with key. The delta of s is searched in delta, the delta
+        of data_m, then the first char gives the key. For case-insensitive
+        strings, data_m is data with the case bit set on every byte and each
+        match is checked on data.
+        """
+        if nocase:
+            s_m = s.translate(CASE_TABLE)
+        else:
+            s_m = s
+        s_delta = xor_delta(s_m)
+        length = len(s)
+        if not nocase and s_delta == '\x00' * len(s_delta):
+            # same char repeated: count each run of equal bytes once
+            i = delta.find(s_delta)
+            while i >= 0:
+                # bytes i to end are equal:
+                match = NOT_NULL.search(delta, i)
+                if match:
+                    end = match.start()
+                else:
+                    end = len(delta)
+                counts[ord(data[i]) ^ ord(s[0])] += (end - i + 1) // length
+                i = delta.find(s_delta, end + 1)
+            return
+        last_end = [0] * 256
+        i = delta.find(s_delta)
+        while i >= 0:
+            key = ord(data_m[i]) ^ ord(s_m[0])
+            if nocase:
+                keys = (key, key | 0x20)
+            else:
+                keys = (key,)
+            for key in keys:
+                if i >= last_end[key] and (not nocase or
+                    data[i:i+length].translate(XOR_TABLES[key]).lower() == s):
+                    counts[key] += 1
+                    last_end[key] = i + length
+            i = delta.find(s_delta, i + 1)
+
+    def score_data (self, data):
+        score = 0
+        for pattern, count in self.bbz.count(data):
+            score += count*pattern.weight
+        return score
+
+    def score_table (self, table, stats):
+        data, hist, bigrams = stats
+        inverse = [0] * 256
+        for i in xrange(256):
+            inverse[ord(table[i])] = i
+        data_lower = None
+        score = 0
+        for pattern in self.bbz.patterns:
+            if pattern.nocase:
+                strings = pattern.pat_lower
+            else:
+                strings = pattern.pat
+            count = 0
+            for s in strings:
+                # bytes of the original data which become each char of s:
+                choices = [preimage(c, pattern.nocase, inverse) for c in s]
+                if len(s) == 1:
+                    count += sum(hist[b] for b in choices[0])
+                    continue
+                if not any(a << 8 | b in bigrams
+                    for a in choices[0] for b in choices[1]):
+                    continue
+                if max(len(c) for c in choices) == 1:
+                    count += data.count(''.join(chr(c[0]) for c in choices))
+                else:
+                    # case-insensitive letters: lowercase transformed data,
+                    # in a single translate
+                    if data_lower is None:
+                        data_lower = data.translate(table.lower())
+                    count += data_lower.count(s)
+            score += count*pattern.weight
+        return score
+
+
+class Top_Scores (object):
+    """
+    Bounded heap keeping the N items with the best scores, returned in the
+    same order as a stable sort of all items by decreasing score.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.heap = []
+        self.count = 0
+
+    def add (self, item, score):
+        # on equal scores, the item added last is dropped first:
+        entry = (score, -self.count, item)
+        self.count += 1
+        if self.size <= 0:
+            return
+        if len(self.heap) < self.size:
+            heapq.heappush(self.heap, entry)
+        elif entry > self.heap[0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def items (self):
+        """
+        Return the list of (item, score), best score first.
+        """
+        return [(item, score) for score, count, item in sorted(self.heap,
+            reverse=True)]
+
+
+def iter_chunks (transform_classes, chunk_size=64):
+    """
+    Split all the parameters of the transform classes into chunks of
+    (index of the class, list of parameters).
+    """
+    for index, Transform_class in enumerate(transform_classes):
+        params = list(Transform_class.iter_params())
+        for i in xrange(0, len(params), chunk_size):
+            yield index, params[i:i+chunk_size]
+
+
+def run_chunks (function, chunks, processes=None, budget=None):
+    """
+    Generator: yield function(chunk) for each chunk, in order, computed by a
+    pool of processes (one per CPU by default, processes=1 to stay in the
+    current process). The pool is forked after the data has been stored in
+    module globals, so all processes share its memory pages without copy.
+    Stops after budget seconds, when provided.
+    The pool only helps the command line: daemon processes such as celery
+    workers cannot fork one and compute all chunks themselves.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    # daemon processes (such as celery workers) cannot start a pool:
+    if multiprocessing.current_process().daemon:
+        processes = 1
+    start_time = time.time()
+    if processes > 1:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap(function, chunks)
+    else:
+        pool = None
+        results = (function(chunk) for chunk in chunks)
+    try:
+        for result in results:
+            yield result
+            if budget is not None and time.time()-start_time > budget:
+                break
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+# set before forking the pool, shared by all processes:
+stage1_scorer = None
+stage1_classes = None
+
+def score_chunk (chunk):
+    index, params_list = chunk
+    Transform_class = stage1_classes[index]
+    return index, [(params, stage1_scorer.score(Transform_class(params)))
+        for params in params_list]
+
+
+def stage1_scores (data, transform_classes, patterns=bbcrack_patterns_stage1,
+    processes=None, budget=None):
+    """
+    Generator: compute the stage 1 score of every transform with all its
+    parameters, yielding (transform, score) in the order of iter_params.
+    See run_chunks for processes and budget.
+    """
+    global stage1_scorer, stage1_classes
+    stage1_scorer = Stage1_Scorer(data, patterns)
+    stage1_scorer.prepare(transform_classes)
+    stage1_classes = list(transform_classes)
+
+    for index, scores in run_chunks(score_chunk, iter_chunks(stage1_classes),
+        processes, budget):
+        for params, score in scores:
+            yield stage1_classes[index](params), score
+
+
 #=== MAIN =====================================================================
 
 if __name__ == '__main__':
@@ -901,6 +1377,10 @@ if __name__ == '__main__':
         help='if the file is a zip archive, open first file from it, using the provided password (requires Python 2.6+)')
     parser.add_option("-p", action="store_true", dest="profiling",
         help='profiling: measure time spent on each pattern.')
+    parser.add_option('-j', '--jobs', dest='jobs', type='int', default=None,
+        help='number of processes for stage 1 (default: one per CPU)')
+    parser.add_option('-b', '--budget', dest='budget', type='int', default=None,
+        help='time budget for stage 1 in seconds, then keep the best scores so far')
 
     (options, args) = parser.parse_args()
 
@@ -925,56 +1405,32 @@ if __name__ == '__main__':
 
     # STAGE 1: quickly count some significant characters to select best transforms
     print 'STAGE 1: quickly counting simple patterns for all transforms'
-    results1 = []
+    # only the N best scores are kept:
+    best1 = Top_Scores(options.keep)
     best_score = 0
-    start_time = time.clock()
-    bbz1 = balbuzard.Balbuzard(bbcrack_patterns_stage1)
-    for Transform_class in transform_classes:
-        # iterate over all possible params for that transform class:
-        for params in Transform_class.iter_params():
-            # instantiate a Transform object with these params
-            transform = Transform_class(params)
-            # transform data:
-            data = transform.transform_string(raw_data)
-            score = 0
-            # search each pattern in transformed data:
-            for pattern, count in bbz1.count(data):
-                score += count*pattern.weight
-                #DEBUG
-##                print 'Found %d * %s weight=%d' % (
-##                    count, pattern.name, pattern.weight)
-                #/DEBUG
-            msg = '\rTransform %s: stage 1 score=%d          ' % (transform.shortname, score)
-            print msg,
-##            print '\n'
-##            spaces = data.count(' ')
-##            nulls = data.count('\x00')
-##            newlines = data.count('\x0D\x0A')
-##            pe = data.count('PE')
-##            mz = data.count('MZ')
-##            dos = data.count("This program cannot be run in DOS mode")
-##            score = spaces + nulls + newlines*100 + pe*100 + mz*100 + dos*10000
-##            print 'Transform %s: score=%d, spaces=%s, nulls=%d, newlines=%d' % (
-##                transform.name, score, spaces, nulls, newlines)
-            results1.append((transform, score))
-            if score >= best_score:
-                best_score = score
-                print '\rBest score so far: %s, stage 1 score=%d' % (transform.shortname, score)
+    # wall clock time, the work is done in other processes:
+    start_time = time.time()
+    for transform, score in stage1_scores(raw_data, transform_classes,
+        processes=options.jobs, budget=options.budget):
+        msg = '\rTransform %s: stage 1 score=%d          ' % (transform.shortname, score)
+        print msg,
+        best1.add(transform, score)
+        if score >= best_score:
+            best_score = score
+            print '\rBest score so far: %s, stage 1 score=%d' % (transform.shortname, score)
     print ''
-    t = time.clock()-start_time
+    t = time.time()-start_time
     print 'Checked %d transforms in %f seconds - %f transforms/s' % (
-        len(results1), t, len(results1)/t)
-    # sort transform results by score:
-    results1 = sorted(results1, key=lambda r:r[1], reverse=True)
-    # keep only the N best scores:
-    results1 = results1[:options.keep]
+        best1.count, t, best1.count/t)
+    results1 = best1.items()
     print '\nTOP %d SCORES stage 1:' % options.keep
     for res in results1:
         print "%20s: %d" % (res[0].shortname, res[1])
 ##    raw_input()
 
     # STAGE 2: search patterns on selected transforms
-    results = []
+    # only the N best scores are kept, with their data:
+    best2 = Top_Scores(options.save)
     bbz = balbuzard.Balbuzard(bbcrack_patterns) #balbuzard.patterns) #
 ##    bbz.add_pattern('CamelCase word', regex=r'([A-Z][a-z0-9]{2,}){2,}', weight=10)
 ##    bbz.add_pattern('Any word longer than 5 chars', regex=r'[A-Za-z]{5,}')
@@ -994,12 +1450,10 @@ if __name__ == '__main__':
             print 'Found %d * %s weight=%d' % (
                 len(matches), pattern.name, pattern.weight)
         print 'Transform %s: score=%d\n' % (transform.shortname, score)
-        results.append((transform, score, data))
+        best2.add((transform, data), score)
 
     print '\nHIGHEST SCORES (>0):'
-    results = sorted(results, key=lambda x: x[1], reverse=True)
-    # take the best N:
-    for transform, score, data in results[:options.save]:
+    for (transform, data), score in best2.items():
         if score > 0:
             print '%s: score %d' % (transform.shortname, score)
             base, ext = os.path.splitext(fname)
@@ -1,6 +1,6 @@
 #! /usr/bin/env python2
 """
-bbharvest - v0.05 2014-01-06 Philippe Lagadec
+bbharvest - v0.06 2026-10-17 Philippe Lagadec
 
 bbharvest is a tool to analyse malware that uses obfuscation such as XOR, ROL,
 ADD (and many combinations) to hide information such as IP addresses, domain
@@ -39,7 +39,7 @@ For more info and updates: http://www.decalage.info/balbuzard
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
-__version__ = '0.05'
+__version__ = '0.06'
 
 #------------------------------------------------------------------------------
 # CHANGELOG:
@@ -51,6 +51,8 @@ __version__ = '0.05'
 # 2014-01-04 v0.04 PL: - use functions from bbcrack to simplify main
 #                      - added -i option for incremental level
 # 2014-01-06 v0.05 PL: - added the possibility to write transform plugins
+# 2026-10-17 v0.06   : - transforms run in a pool of processes, -j and -b
+#                        options as in bbcrack
 
 
 #------------------------------------------------------------------------------
@@ -75,40 +77,63 @@ from balbuzard import harvest_patterns
 
 #--- FUNCTIONS ----------------------------------------------------------------
 
+# set before forking the pool, shared by all processes:
+harvest_data = None
+harvest_bbz = None
+harvest_classes = None
+
+def harvest_chunk (chunk):
+    """
+    Apply the transforms of a chunk (see iter_chunks) to the data, and return
+    the list of (transform shortname, index, pattern name, match) found.
+    """
+    class_index, params_list = chunk
+    Transform_class = harvest_classes[class_index]
+    found = []
+    for params in params_list:
+        # instantiate a Transform object with these params
+        transform = Transform_class(params)
+        # transform data:
+        data = transform.transform_string(harvest_data)
+        # search each pattern in transformed data:
+        for pattern, matches in harvest_bbz.scan(data):
+            for index, match in matches:
+                if len(match)>3:
+                    found.append((transform.shortname, index, pattern.name, match))
+    return transform.shortname, found
+
+
 def harvest (raw_data, transform_classes, filename, profiling=False,
-    csv_writer=None):
+    csv_writer=None, processes=None, budget=None):
     """
     apply all transforms to raw_data, and extract all patterns of interest
     (Slow, but useful when a file uses multiple transforms.)
+    Transforms run in a pool of processes, see run_chunks in bbcrack.
     """
+    global harvest_data, harvest_bbz, harvest_classes
     print '*** WARNING: harvest mode may return a lot of false positives!'
     # here we only want to extract patterns of interest
     bbz = balbuzard.Balbuzard(harvest_patterns)
     if not profiling:
-        for Transform_class in transform_classes:
-            # iterate over all possible params for that transform class:
-            for params in Transform_class.iter_params():
-                # instantiate a Transform object with these params
-                transform = Transform_class(params)
-                msg = 'transform %s          \r' % transform.shortname
-                print msg,
-                # transform data:
-                data = transform.transform_string(raw_data)
-                # search each pattern in transformed data:
-                for pattern, matches in bbz.scan(data):
-                    for index, match in matches:
-                        if len(match)>3:
-                            # limit matched string display to 50 chars:
-                            m = repr(match)
-                            if len(m)> 50:
-                                m = m[:24]+'...'+m[-23:]
-                            print '%s: at %08X %s, string=%s' % (
-                                transform.shortname, index, pattern.name, m)
-                            if csv_writer is not None:
-                                #['Filename', 'Transform', 'Index', 'Pattern name', 'Found string', 'Length']
-                                csv_writer.writerow([filename,
-                                    transform.shortname, '0x%08X' % index,
-                                    pattern.name, m, len(match)])
+        harvest_data = raw_data
+        harvest_bbz = bbz
+        harvest_classes = list(transform_classes)
+        for shortname, found in run_chunks(harvest_chunk,
+            iter_chunks(harvest_classes), processes, budget):
+            msg = 'transform %s          \r' % shortname
+            print msg,
+            for shortname, index, name, match in found:
+                # limit matched string display to 50 chars:
+                m = repr(match)
+                if len(m)> 50:
+                    m = m[:24]+'...'+m[-23:]
+                print '%s: at %08X %s, string=%s' % (
+                    shortname, index, name, m)
+                if csv_writer is not None:
+                    #['Filename', 'Transform', 'Index', 'Pattern name', 'Found string', 'Length']
+                    csv_writer.writerow([filename,
+                        shortname, '0x%08X' % index,
+                        name, m, len(match)])
         print '                                      '
     else:
         # same code, with profiling:
@@ -166,6 +191,10 @@ if __name__ == '__main__':
         help='if the file is a zip archive, open first file from it, using the provided password (requires Python 2.6+)')
     parser.add_option("-p", action="store_true", dest="profiling",
         help='profiling: measure time spent on each pattern.')
+    parser.add_option('-j', '--jobs', dest='jobs', type='int', default=None,
+        help='number of processes (default: one per CPU)')
+    parser.add_option('-b', '--budget', dest='budget', type='int', default=None,
+        help='time budget in seconds, then stop')
 
     (options, args) = parser.parse_args()
 
@@ -201,7 +230,7 @@ if __name__ == '__main__':
 
 
     harvest(raw_data, transform_classes, fname, profiling=options.profiling,
-        csv_writer=csv_writer)
+        csv_writer=csv_writer, processes=options.jobs, budget=options.budget)
 
 
 
@@ -25,7 +25,7 @@
 
 import re
 
-def get(filename):
+def get(filename, data=None):
 	
 	trk     = []
 	
@@ -48,15 +48,19 @@ def get(filename):
 		"Torpig (UPX) VMM Trick": "\x51\x51\x0F\x01\x27\x00\xC1\xFB\xB5\xD5\x35\x02\xE2\xC3\xD1\x66\x25\x32\xBD\x83\x7F\xB7\x4E\x3D\x06\x80\x0F\x95\xC1\x8B\xC1\xC3"
 		}
 		
-	with open(filename, "rb") as f:
-		buf = f.read()
-		for string in VM_Str:
-			match = re.findall(VM_Str[string], buf, re.IGNORECASE | re.MULTILINE)
-			if match:
-				trk.append(string)
-				
-		for trick in VM_Sign:
-			if buf.find(VM_Sign[trick][::-1]) > -1:
-				trk.append(trick)
+	if data is not None:
+		buf = data
+	else:
+		with open(filename, "rb") as f:
+			buf = f.read()
+
+	for string in VM_Str:
+		match = re.search(VM_Str[string], buf, re.IGNORECASE | re.MULTILINE)
+		if match:
+			trk.append(string)
+			
+	for trick in VM_Sign:
+		if buf.find(VM_Sign[trick][::-1]) > -1:
+			trk.append(trick)
 
 	return trk
@@ -37,87 +37,80 @@ def valid_ip(address):
     except:
         return False
 
-def get(filename, strings_match):
-	strings_info = json.loads(stringstat.get(filename))
+# strings never hold a newline, they are joined with one and each regex
+# runs once over all of them; nothing below can match across the \n
+URL_RE = re.compile(r'((smb|srm|ssh|ftps?|file|https?):((//)|(\\\\))+([\w\d:#@%/;$()~_?\+-=\\\.&](#!)?)*)', re.MULTILINE)
+IP_RE = re.compile(r'[0-9]+(?:\.[0-9]+){3}', re.MULTILINE)
+IP_ZERO_RE = re.compile(r'[0-9]{1,}\.[0-9]{1,}\.[0-9]{1,}\.0')
+FILE_RE = re.compile("(.+(\.([a-z]{2,3}$)|\/.+\/|\\\.+\\\))+", re.IGNORECASE | re.MULTILINE)
+# the endings FILE_RE needs without the leading .+ that backtracks over
+# the whole string, a string they do not match is never handed to it
+FILE_HINT_RE = re.compile(r'\.[a-z]{2,3}$|/.+/|\\.+\\', re.IGNORECASE | re.MULTILINE)
+
+def get_extensions(file_type):
+	# lower case extension -> index of the first filetype that has it
+	extensions = {}
+	for index, (key, value) in enumerate(file_type):
+		extensions.setdefault(value.lower(), index)
+	return extensions
+
+def get_filetype(file, extensions):
+	# every dotted suffix of the name is one dict lookup, the filetype
+	# listed first wins as with the regex per filetype
+	lower = file.lower()
+	found = None
+	index = lower.find('.')
+	while index >= 0:
+		match = extensions.get(lower[index:])
+		if match is not None and (found is None or match < found):
+			found = match
+		index = lower.find('.', index + 1)
+	return found
+
+def get(filename, strings_match, data=None):
+	strings_info = json.loads(stringstat.get(filename, data))
 	strings_list = strings_info['content']
-	ip_list = []
-	file_list = []
 	filetype_dict = {}
-	url_list = []
 	fuzzing_dict = {}
-	apialert_list = []
-	antidbg_list = []
 
 	# Get filetype and fuzzing
 	file_type = strings_match['filetype'].items()
-	fuzzing_list = strings_match['fuzzing'].items()
+	fuzzing_list = [(key, re.compile(value, re.IGNORECASE | re.MULTILINE)) for key, value in strings_match['fuzzing'].items()]
 
 	# Strings analysis
-	for string in strings_list:
-		# URL list
-		urllist = re.findall(r'((smb|srm|ssh|ftps?|file|https?):((//)|(\\\\))+([\w\d:#@%/;$()~_?\+-=\\\.&](#!)?)*)', string, re.MULTILINE)
-		if urllist:
-			for url in urllist:
-				url_list.append(url[0])
+	text = '\n'.join(strings_list)
 
-		# IP list
-		iplist = re.findall(r'[0-9]+(?:\.[0-9]+){3}', string, re.MULTILINE)
-		if iplist:
-			for ip in iplist:
-				if valid_ip(str(ip)) and not re.findall(r'[0-9]{1,}\.[0-9]{1,}\.[0-9]{1,}\.0', str(ip)):
-					ip_list.append(str(ip))
+	# URL list
+	url_list = filter(None, list(set(url[0] for url in URL_RE.findall(text))))
 
-		# FILE list
-		fname = re.findall("(.+(\.([a-z]{2,3}$)|\/.+\/|\\\.+\\\))+", string, re.IGNORECASE | re.MULTILINE)
-		if fname:
-			for word in fname:
-				word = filter(None, word[0])
-				file_list.append(word)
-
-	# Purge list
-	ip_list = filter(None, list(set([item for item in ip_list])))
-	url_list = filter(None, list(set([item for item in url_list])))
-	
-	# Initialize filetype
-	for key, value in file_type:
-		filetype_dict[key] = []
+	# IP list
+	ip_list = filter(None, list(set(str(ip) for ip in IP_RE.findall(text)
+		if valid_ip(str(ip)) and not IP_ZERO_RE.findall(str(ip)))))
 
 	# Search for valid filename
-	array_tmp = []
-	for file in file_list:
-		for key, value in file_type:
-			match = re.findall("\\"+value+"$", file, re.IGNORECASE | re.MULTILINE)
-			if match and file.lower() not in array_tmp and len(file) > 4: 
-				filetype_dict[key].append(file)
-				array_tmp.append(file.lower())
-	
-	# Remove empty key filetype
-	for key, value in filetype_dict.items():
-		if not filetype_dict[key]:
-			del filetype_dict[key]
-
-	# Initialize fuzzing
-	for key, value in fuzzing_list:
-		fuzzing_dict[key] = []
-
-	# Strings analysis for fuzzing
-	array_tmp = []
-	for string in strings_list:
-		for key, value in fuzzing_list:
-			fuzz_match = re.findall(value, string, re.IGNORECASE | re.MULTILINE)
-			if fuzz_match and string.lower() not in array_tmp:
-				fuzzing_dict[key].append(string)
-				array_tmp.append(string.lower())
+	extensions = get_extensions(file_type)
+	seen = set()
+	for word in FILE_RE.findall('\n'.join(string for string in strings_list if FILE_HINT_RE.search(string))):
+		file = filter(None, word[0])
+		if len(file) <= 4 or file.lower() in seen:
+			continue
+		index = get_filetype(file, extensions)
+		if index is not None:
+			filetype_dict.setdefault(file_type[index][0], []).append(file)
+			seen.add(file.lower())
 
-	# Remove empty key filetype
-	for key, value in filetype_dict.items():
-		if not filetype_dict[key]:
-			del filetype_dict[key]
+	# Strings analysis for fuzzing, the combined pattern skips the
+	# strings none of them match
+	if fuzzing_list:
+		fuzzing = re.compile("|".join("(?:%s)" % value.pattern for key, value in fuzzing_list), re.IGNORECASE | re.MULTILINE)
+		seen = set()
+		for string in strings_list:
+			if string.lower() in seen or not fuzzing.search(string):
+				continue
+			for key, value in fuzzing_list:
+				if value.search(string):
+					fuzzing_dict.setdefault(key, []).append(string)
+					seen.add(string.lower())
+					break
 
-	# Remove empty key fuzzing
-	for key, value in fuzzing_list:
-		if not fuzzing_dict[key]:
-			del fuzzing_dict[key]
-	
 	return {"file":  filetype_dict, "url": url_list, "ip": ip_list, "fuzzing": fuzzing_dict}
-		
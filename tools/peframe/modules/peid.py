@@ -26,7 +26,11 @@
 import peutils
 
 def get(pe, userdb):
-	signatures = peutils.SignatureDatabase(userdb)
+	# peframe hands over the parsed database, a path still works
+	if hasattr(userdb, 'match_all'):
+		signatures = userdb
+	else:
+		signatures = peutils.SignatureDatabase(userdb)
 	matches = signatures.match_all(pe, ep_only = True)
 	array = []
 	if matches:
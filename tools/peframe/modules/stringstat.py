@@ -26,40 +26,40 @@
 
 # BETA
 
+import os
 import re
-import string
+import sys
 import magic
 import json
 import binascii
 
-def get_process(stream):
-    result = ''
-    while True:
-		data = stream.read(1024*4)
-		if not data: break
-		for char in data:
-			if char in string.printable:
-				result += char
-				continue
-			if len(result) >= 4:
-				yield result
-			result = ''
+# shared extractor from the analysis lib, also when peframe runs on its own
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'lib'))
+from string_extract import iter_strings, iter_file_strings
+
+def get_records(filename, data=None, min_length=4, encodings=("ascii", "utf-16le")):
+	if data is not None:
+		return iter_strings(data, min_length, encodings)
+	return iter_file_strings(open(filename, 'rb'), min_length, encodings)
 
 def filetype(filename):
 	type = magic.from_file(filename)
 	return type
 
-def get_unicode(filename):
-	PEtoUnicode = open(filename, 'rb').read()
-	pattern = re.compile(ur'(?:[\x20-\x7E][\x00]){3,}')
-	return [w.decode('utf-16le') for w in pattern.findall(PEtoUnicode)]
+def get_unicode(filename, data=None):
+	return [text.decode('utf-8') for offset, encoding, text in get_records(filename, data, 3, ("utf-16le",))]
+
+def get_ascii(filename, data=None):
+	return [text.decode('utf-8') for offset, encoding, text in get_records(filename, data, 4, ("ascii",))]
 
-def get_ascii(filename):
-	PEtoStr = open(filename, 'rb')
-	return [w.decode('utf-8') for w in get_process(PEtoStr)]
+def read_all(filename, data=None):
+	if data is not None:
+		return data[:]
+	with open(filename, 'r') as f:
+		return f.read()
 
 # MAIN
-def get(filename):
+def get(filename, data=None):
 	strings = []
 	ascii = []
 	utf16le = []
@@ -69,27 +69,31 @@ def get(filename):
 	
 	# UTF-16
 	if re.findall(r'UTF-16', ftype) and re.findall(r'text', ftype):
-		utf16le = get_unicode(filename)
+		utf16le = get_unicode(filename, data)
 		utf16le = str(utf16le).split(' ')
 		strings = utf16le
 	# ASCII/UTF-8
 	elif re.findall(r'ASCII|UTF-8', ftype) and re.findall(r'text', ftype):
-		textfile = open(filename, 'r')
-		ascii = textfile.read().split()
-		textfile.close()
+		ascii = read_all(filename, data).split()
 		strings = ascii
 	# BINARY (ASCII/UTF-8 + UTF-16)
 	else:
 		# re.findall(r'MIME entity|XML', ftype):
-		ascii = list(set(get_ascii(filename)))
-		utf16le = list(set(get_unicode(filename)))
-		strings = utf16le + ascii + strings
+		# both encodings in one pass
+		ascii = set()
+		utf16le = set()
+		for offset, encoding, text in get_records(filename, data):
+			if encoding == "ascii":
+				ascii.add(text.decode('utf-8'))
+			else:
+				utf16le.add(text.decode('utf-8'))
+		strings = list(utf16le) + list(ascii) + strings
 
 		if not strings:
 			try:
-				strings = open(filename, 'r').read().decode('utf-8').split('\n')
+				strings = read_all(filename, data).decode('utf-8').split('\n')
 			except:
-				strings = open(filename, 'r').read().decode('latin-1').split('\n')
+				strings = read_all(filename, data).decode('latin-1').split('\n')
 
 			strings = [repr(string) for string in strings]
 	
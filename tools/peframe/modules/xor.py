@@ -23,41 +23,51 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 # ----------------------------------------------------------------------
 
-import array
 import binascii
- 
+
+# numpy when installed, the big integer xor below otherwise
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+KEY_LENGTHS = [1, 2, 4, 8]
+SEARCH_STRING = "This program cannot be run in DOS mode."
+
 def xor_delta(s, key_len = 1):
-    delta = array.array('B', s)
-     
-    for x in xrange(key_len, len(s)):
-        delta[x - key_len] ^= delta[x]
-         
-    """ return the delta as a string """
-    return delta.tostring()[:-key_len]
- 
-def get(filename):
+	""" return the delta as a string, byte i is s[i] ^ s[i + key_len] """
+	size = len(s) - key_len
+	if size <= 0:
+		return ''
+
+	if numpy is not None:
+		buf = numpy.frombuffer(buffer(s), dtype=numpy.uint8)
+		return (buf[key_len:] ^ buf[:-key_len]).tostring()
+
+	# one xor over the whole buffer as a single long, still no python
+	# loop per byte
+	head = int(binascii.hexlify(buffer(s, 0, size)), 16)
+	tail = int(binascii.hexlify(buffer(s, key_len, size)), 16)
+	return binascii.unhexlify('%0*x' % (size * 2, head ^ tail))
+
+def get(filename, data=None, key_lengths=None):
 	check = {}
-	search_file = open(filename, "r").read()
-	key_lengths=[1,2,4,8]
-	search_string = "This program cannot be run in DOS mode."
-	 
-	for l in key_lengths:
+	if data is not None:
+		search_file = data
+	else:
+		search_file = open(filename, "rb").read()
+	search_string = SEARCH_STRING
+
+	for l in key_lengths or KEY_LENGTHS:
 		key_delta = xor_delta(search_string, l)
-		 
 		doc_delta = xor_delta(search_file, l)
-		 
-		offset = -1
-		while(True):
-			offset += 1
-			offset = doc_delta.find(key_delta, offset)
-			if(offset > 0):
-				check.update({l: offset})
-			else:
-				break
-
-	detect = [item for item in check.items() if item[1] == 78]
-
-	if detect or check == {}:
-		return {}
-	else:
-		return check
+
+		offset = doc_delta.find(key_delta)
+		while offset >= 0:
+			# the plain dos stub matches every key length, only the xored
+			# copies are reported
+			if search_file[offset:offset + len(search_string)] != search_string:
+				check.setdefault(l, []).append(offset)
+			offset = doc_delta.find(key_delta, offset + 1)
+
+	return check
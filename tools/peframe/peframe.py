@@ -57,6 +57,78 @@ from modules import funcexport
 from modules import stringstat
 from modules import virustotal
 
+_ROOT = os.path.abspath(os.path.dirname(__file__))
+
+strings_match = None
+userdb = None
+signatures_stamp = None
+signatures_checked = 0
+
+# seconds between mtime checks of the signature files when running
+# inside a worker
+CHECK_INTERVAL = 30
+
+def get_data(path):
+	return os.path.join(_ROOT, 'signatures', path)
+
+def get_signatures_stamp():
+	stamp = []
+	for path in ('stringsmatch.json', 'userdb.txt'):
+		try:
+			st = os.stat(get_data(path))
+			stamp.append((st.st_size, st.st_mtime))
+		except OSError:
+			stamp.append(None)
+	return stamp
+
+def signatures_changed():
+	global signatures_checked
+
+	if time.time() - signatures_checked < CHECK_INTERVAL:
+		return False
+	signatures_checked = time.time()
+	return get_signatures_stamp() != signatures_stamp
+
+def load_signatures():
+	global strings_match, userdb, signatures_stamp, signatures_checked
+
+	stamp = get_signatures_stamp()
+
+	# Load local file stringsmatch.json
+	fn_stringsmatch	= get_data('stringsmatch.json')
+	with open(fn_stringsmatch) as data_file:
+		matches = json.load(data_file)
+
+	# Load PEID userdb.txt database, parsed once instead of on every file
+	database = peutils.SignatureDatabase(get_data('userdb.txt'))
+
+	# both are built before either is replaced
+	strings_match, userdb = matches, database
+	signatures_stamp = stamp
+	signatures_checked = time.time()
+
+def get_json(filename, sample=None):
+	global fname, fsize, ftype, pe
+
+	if strings_match is None or signatures_changed():
+		load_signatures()
+
+	fname = os.path.basename(filename)
+	ftype = filetype(filename)
+	if sample is not None:
+		fsize = sample.size
+	else:
+		fsize = os.path.getsize(filename)
+	if re.match(r'^PE[0-9]{2}|^MS-DOS', ftype):
+		if sample is not None:
+			pe = pefile.PE(data=sample.data)
+		else:
+			pe = pefile.PE(filename)
+		return get_pe_fileinfo(pe, filename, sample)
+	else:
+		pe = None
+		return get_fileinfo(filename, sample)
+
 def isfile(filename):
 	if os.path.isfile(filename):
 		return True
@@ -71,24 +143,27 @@ def filetype(filename):
 def get_imphash(filename):
 	return pe.get_imphash()
 
-def get_hash(filename):
-	fh = open(filename, 'rb')
-	m = hashlib.md5()
-	s = hashlib.sha1()
-	s256 = hashlib.sha256()
-	
-	while True:
-		data = fh.read(8192)
-		if not data:
-			break
-
-		m.update(data)
-		s.update(data)
-		s256.update(data)
-
-	md5  = m.hexdigest()
-	sha1 = s.hexdigest()
-	sha256 = s256.hexdigest()
+def get_hash(filename, sample=None):
+	if sample is not None:
+		md5, sha1, sha256 = sample.md5, sample.sha1, sample.sha256
+	else:
+		fh = open(filename, 'rb')
+		m = hashlib.md5()
+		s = hashlib.sha1()
+		s256 = hashlib.sha256()
+		
+		while True:
+			data = fh.read(8192)
+			if not data:
+				break
+
+			m.update(data)
+			s.update(data)
+			s256.update(data)
+
+		md5  = m.hexdigest()
+		sha1 = s.hexdigest()
+		sha256 = s256.hexdigest()
 
 	try:
 		ih = get_imphash(filename)
@@ -96,7 +171,9 @@ def get_hash(filename):
 	except:
 		return md5,sha1,sha256
 	
-def get_pe_fileinfo(pe, filename):
+def get_pe_fileinfo(pe, filename, sample=None):
+	data = sample.data if sample is not None else None
+
 	# is dll?
 	dll = pe.FILE_HEADER.IMAGE_FILE_DLL
 	
@@ -114,7 +191,7 @@ def get_pe_fileinfo(pe, filename):
 
 	# get md5, sha1, sha256, imphash
 
-	md5, sha1, sha256, imphash = get_hash(filename)
+	md5, sha1, sha256, imphash = get_hash(filename, sample)
 	hash_info = {"md5": md5, "sha1": sha1, "sha256": sha256}
 	
 	detected = []
@@ -139,18 +216,18 @@ def get_pe_fileinfo(pe, filename):
 	if antidbg: detected.append("antidbg")
 
 	# Xor
-	xorcheck = xor.get(filename)
+	xorcheck = xor.get(filename, data, strings_match.get('xor', {}).get('key_lengths'))
 	if xorcheck: detected.append("xor")
 
 	# anti virtual machine
-	antivirtualmachine = antivm.get(filename)
+	antivirtualmachine = antivm.get(filename, data)
 	if antivirtualmachine: detected.append("antivm")
 	
 	# api alert suspicious
 	apialert_info = apialert.get(pe, strings_match)
 	
 	# file and url
-	fileurl_info = fileurl.get(filename, strings_match)
+	fileurl_info = fileurl.get(filename, strings_match, data)
 	file_info = fileurl_info["file"]
 	url_info = fileurl_info["url"]
 	ip_info = fileurl_info["ip"]
@@ -207,18 +284,17 @@ def get_pe_fileinfo(pe, filename):
 						}, 
 						indent=4, separators=(',', ': '))
 
-def get_fileinfo(filename):
-	strings_info = json.loads(stringstat.get(filename))
-	all_strings = strings_info["content"]
-	
+def get_fileinfo(filename, sample=None):
+	data = sample.data if sample is not None else None
+
 	# file and url
-	fileurl_info = fileurl.get(filename, strings_match)
+	fileurl_info = fileurl.get(filename, strings_match, data)
 	file_info = fileurl_info["file"]
 	url_info = fileurl_info["url"]
 	ip_info = fileurl_info["ip"]
 	fuzzing_info = fileurl_info["fuzzing"]
 
-	md5, sha1, sha256 = get_hash(filename)
+	md5, sha1, sha256 = get_hash(filename, sample)[:3]
 	hash_info = {"md5": md5, "sha1": sha1, "sha256": sha256}
 
 	# virustotal
@@ -290,8 +366,9 @@ def stdoutput(get_info_from):
 					print "Xor info"
 					print "-"*60
 					print "Key length".ljust(15), "Offset (hex)".ljust(15), "Offset (dec)"
-					for elem in output['pe_info'][item]:
-						print elem.ljust(15), hex(output['pe_info'][item][elem]).ljust(15), output['pe_info'][item][elem]
+					for elem in sorted(output['pe_info'][item], key=int):
+						for offset in output['pe_info'][item][elem]:
+							print elem.ljust(15), hex(offset).ljust(15), offset
 
 				if item == 'sign_info':
 					print
@@ -435,19 +512,7 @@ def main():
 		print help.VERSION
 		exit(0)
 
-	_ROOT = os.path.abspath(os.path.dirname(__file__))
-	def get_data(path):
-		return os.path.join(_ROOT, 'signatures', path)
-
-	# Load local file stringsmatch.json
-	fn_stringsmatch	= get_data('stringsmatch.json')
-	global strings_match
-	with open(fn_stringsmatch) as data_file:
-		strings_match = json.load(data_file)
-
-	# Load PEID userdb.txt database
-	global userdb
-	userdb = get_data('userdb.txt')
+	load_signatures()
 
 	global filename, fname, fsize, ftype, pe
 	
@@ -473,11 +538,7 @@ def main():
 		fsize = os.path.getsize(filename)
 		ftype = filetype(filename)
 		if option == "--json":
-			if re.match(r'^PE[0-9]{2}|^MS-DOS', ftype):
-				pe = pefile.PE(filename)
-				print get_pe_fileinfo(pe, filename); exit(0)
-			else:
-				print get_fileinfo(filename); exit(0)
+			print get_json(filename); exit(0)
 		elif option == "--strings":
 			print stringstat.get(filename); exit(0)
 		else: